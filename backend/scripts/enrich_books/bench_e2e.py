@@ -0,0 +1,162 @@
+# backend/scripts/enrich_books/bench_e2e.py
+# End-to-end benchmark of enrich_books.py, fully offline: the real main()
+# runs against stub_api.py (synthetic OpenLibrary / Google answers with
+# configurable latency, error rate and quotas) and a throwaway database
+# created on the configured server, migrated with V1/V2 and seeded with N
+# synthetic books. The database is dropped afterwards (--keep-db to inspect).
+# Reports books/s, p50/p99/total per stage, DB time and peak memory.
+#   python bench_e2e.py [--books 5000] [--concurrency 8] [--latency-ms 30] [--error-rate 0.01]
+#                       [--ol-quota 0 --gb-quota 0 --window 1] [--write-mode batch|copy]
+from __future__ import annotations
+
+import argparse, os, sys, tempfile, time, tracemalloc
+from typing import Callable, Dict, List
+
+from db import PG, connect
+from stub_api import Quota, StubAPI
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "..", "demo", "src", "main", "resources", "db", "migration")
+
+SEED_SQL = """
+  INSERT INTO books (isbn13, title, author, genres, page_count, description)
+  SELECT (9780000000000 + g)::text, 'Book ' || g, 'Author ' || (g %% 997),
+         CASE WHEN g %% 5 = 0 THEN ARRAY['Fiction'] ELSE '{}' END,   -- some rows only miss part of the fields
+         CASE WHEN g %% 3 = 0 THEN 100 + g %% 500 END,
+         CASE WHEN g %% 7 = 0 THEN 'Already described, book number ' || g END
+  FROM generate_series(1, %s) g
+"""
+
+Timings = Dict[str, List[float]]
+
+
+def timed(timings: Timings, stage: str, fn: Callable) -> Callable:
+    samples = timings.setdefault(stage, [])
+
+    def wrapper(*a, **kw):
+        t0 = time.perf_counter()
+        try:
+            return fn(*a, **kw)
+        finally:
+            samples.append(time.perf_counter() - t0)  # list.append is atomic
+    return wrapper
+
+
+def pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+
+def create_db(name: str, books: int):
+    admin = connect()
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'CREATE DATABASE "{name}"')
+    admin.close()
+    conn = connect(dbname=name)
+    with conn.cursor() as cur:
+        for f in sorted(os.listdir(MIGRATIONS)):
+            if f.endswith(".sql"):
+                with open(os.path.join(MIGRATIONS, f), encoding="utf-8") as sql:
+                    cur.execute(sql.read())
+        cur.execute(SEED_SQL, (books,))
+    conn.commit()
+    conn.close()
+
+
+def drop_db(name: str):
+    admin = connect()
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    admin.close()
+
+
+def max_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--books", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=30)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of random 503s")
+    ap.add_argument("--ol-quota", type=int, default=0, help="OpenLibrary requests per window (0 = unlimited)")
+    ap.add_argument("--gb-quota", type=int, default=0, help="Google requests per window (0 = unlimited)")
+    ap.add_argument("--window", type=float, default=1.0)
+    ap.add_argument("--rate", type=float, default=0, help="OL/GB start rate, req/s (0 = unlimited)")
+    ap.add_argument("--write-mode", default="batch", choices=("batch", "copy"))
+    ap.add_argument("--trace-mem", action="store_true", help="tracemalloc peak (slower)")
+    ap.add_argument("--keep-db", action="store_true")
+    args = ap.parse_args()
+
+    stub = StubAPI(ol=Quota(args.ol_quota, args.window, base_ms=args.latency_ms),
+                   gb=Quota(args.gb_quota, args.window, base_ms=args.latency_ms),
+                   error_rate=args.error_rate).start()
+    journal = os.path.join(tempfile.mkdtemp(prefix="bench_e2e_"), "journal.jsonl")
+    # enrich_books reads its config at import
+    os.environ.update(OL_BASE_URL=stub.url, GB_BASE_URL=stub.url, HTTP_CACHE_PATH="", JOURNAL_PATH=journal,
+                      CONCURRENCY=str(args.concurrency), WRITE_MODE=args.write_mode, MAX_BOOKS=str(args.books),
+                      OL_RATE_PER_SEC=str(args.rate), GB_RATE_PER_SEC=str(args.rate), METRICS_LOG_SEC="0")
+    import enrich_books as eb
+
+    name = f"enrich_bench_{os.getpid()}"
+    print(f"Seeding {args.books} books into {name} on {PG['host']}:{PG['port']} ...")
+    create_db(name, args.books)
+    PG["dbname"] = name  # every later connect() (incl. enrich_books' pool) lands in the bench db
+    try:
+        conn = connect()
+        with conn.cursor() as cur:
+            eb.ensure_schema(cur)  # generated columns + queue index: setup, not part of the run
+        conn.commit()
+        conn.close()
+
+        timings: Timings = {}
+        eb.fetch_isbns_to_enrich = timed(timings, "db.queue_page", eb.fetch_isbns_to_enrich)
+        eb.load_todo = timed(timings, "db.load_todo", eb.load_todo)
+        eb.write_enrichment = timed(timings, "db.write", eb.write_enrichment)
+        eb.enrich_many = timed(timings, "fetch.chunk", eb.enrich_many)
+        eb._fetch_json = timed(timings, "http.request", eb._fetch_json)
+
+        if args.trace_mem:
+            tracemalloc.start()
+        sys.argv = ["enrich_books.py"]
+        t0 = time.perf_counter()
+        eb.main()
+        wall = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] / 2**20 if args.trace_mem else None
+
+        conn = connect()
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FILTER (WHERE attempt_count > 0), count(*) FILTER (WHERE NOT needs_enrichment) "
+                        "FROM books")
+            attempted, complete = cur.fetchone()
+        conn.close()
+    finally:
+        stub.stop()
+        if args.keep_db:
+            print(f"Kept database {name}")
+        else:
+            drop_db(name)
+
+    m = eb.METRICS
+    print(f"\nbooks attempted {attempted}/{args.books}, fully enriched {complete}, wall {wall:.2f}s, "
+          f"{attempted / wall:.1f} books/s")
+    print(f"http: {int(m.total('http_responses'))} responses, {int(m.total('http_responses', code=429))} x 429, "
+          f"{int(m.total('http_responses', code=503))} x 503, {int(m.total('http_retries'))} retries; "
+          f"stub saw {sum(stub.counts.values())}")
+    print(f"\n{'stage':<16} {'n':>7} {'p50_ms':>9} {'p99_ms':>9} {'total_s':>9}")
+    for stage, xs in sorted(timings.items()):
+        print(f"{stage:<16} {len(xs):>7} {pct(xs, .5) * 1000:>9.2f} {pct(xs, .99) * 1000:>9.2f} {sum(xs):>9.2f}")
+    db_s = sum(sum(xs) for stage, xs in timings.items() if stage.startswith("db."))
+    print(f"\nDB time {db_s:.2f}s ({db_s / wall:.0%} of wall), max RSS {max_rss_mb():.0f} MiB"
+          + (f", Python heap peak {peak:.1f} MiB" if peak is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# backend/scripts/enrich_books/bench_popularity.py
+# Benchmark: full book_popularity aggregation vs incremental delta refresh.
+# Seeds session-local TEMP books/ratings/aggregate tables (they shadow the
+# public ones for this connection only), then for each catalogue size times
+# the view's full GROUP BY against popularity.incremental() for growing
+# numbers of changed ratings, and verifies the result with the checker.
+#   python bench_popularity.py [--ratings 100000,1000000] [--deltas 100,1000,10000]
+from __future__ import annotations
+
+import argparse, time
+
+from db import connect
+from popularity import check, full_rebuild, incremental
+
+BOOKS = 50_000
+USERS = 100_000
+
+VIEW_SQL = """
+  SELECT b.id, COALESCE(AVG(r.rating), 0) AS avg_rating, COUNT(r.*) AS n_ratings
+  FROM books b LEFT JOIN ratings r ON r.book_id = b.id
+  GROUP BY b.id
+"""
+
+
+def seed(cur, n_ratings: int) -> None:
+    for t in ("ratings", "books", "book_rating_agg", "popularity_applied", "popularity_totals", "job_watermarks"):
+        cur.execute(f"DROP TABLE IF EXISTS pg_temp.{t}")
+    cur.execute("CREATE TEMP TABLE books (id bigint PRIMARY KEY)")
+    cur.execute("INSERT INTO books SELECT g FROM generate_series(1, %s) g", (BOOKS,))
+    cur.execute("""
+        CREATE TEMP TABLE ratings (
+          user_id  bigint,
+          book_id  bigint,
+          rating   smallint,
+          rated_at timestamptz DEFAULT now(),
+          PRIMARY KEY (user_id, book_id)
+        )
+    """)
+    # skewed towards low book ids, ~60% implicit zeros like BX
+    cur.execute("""
+        INSERT INTO ratings (user_id, book_id, rating, rated_at)
+        SELECT DISTINCT ON (u, b) u, b,
+               CASE WHEN random() < 0.6 THEN 0 ELSE 1 + (random() * 9)::int END,
+               now() - INTERVAL '1 day'
+        FROM (SELECT 1 + (random() * %s)::bigint AS u,
+                     1 + (power(random(), 2) * (%s - 1))::bigint AS b
+              FROM generate_series(1, %s)) g
+    """, (USERS - 1, BOOKS, n_ratings))
+    cur.execute("CREATE INDEX ON ratings (rated_at)")
+    cur.execute("""
+        CREATE TEMP TABLE book_rating_agg (
+          book_id bigint PRIMARY KEY, rating_sum bigint NOT NULL DEFAULT 0,
+          rating_count int NOT NULL DEFAULT 0, score real, updated_at timestamptz NOT NULL DEFAULT now()
+        );
+        CREATE TEMP TABLE popularity_applied (
+          user_id bigint, book_id bigint, rating smallint NOT NULL, PRIMARY KEY (user_id, book_id)
+        );
+        CREATE TEMP TABLE popularity_totals (
+          id boolean PRIMARY KEY DEFAULT true, rating_sum bigint NOT NULL DEFAULT 0,
+          rating_count bigint NOT NULL DEFAULT 0
+        );
+        INSERT INTO popularity_totals DEFAULT VALUES;
+        CREATE TEMP TABLE job_watermarks (
+          job text PRIMARY KEY, mark timestamptz NOT NULL, updated_at timestamptz NOT NULL DEFAULT now()
+        );
+    """)
+    cur.execute("ANALYZE books; ANALYZE ratings")
+
+
+def change(cur, n: int, first_user: int) -> None:
+    """Half re-rated existing ratings, half new ones (users from `first_user` on)."""
+    cur.execute("""
+        UPDATE ratings SET rating = (rating + 3) %% 11, rated_at = clock_timestamp()
+        WHERE ctid IN (SELECT ctid FROM ratings ORDER BY random() LIMIT %s)
+    """, (n // 2,))
+    cur.execute("""
+        INSERT INTO ratings (user_id, book_id, rating, rated_at)
+        SELECT %s + g, 1 + (g %% %s), 1 + g %% 10, clock_timestamp()
+        FROM generate_series(1, %s) g
+        ON CONFLICT DO NOTHING
+    """, (first_user, BOOKS, n - n // 2))
+
+
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ratings", default="100000,1000000")
+    ap.add_argument("--deltas", default="100,1000,10000")
+    args = ap.parse_args()
+
+    conn = connect()
+    cur = conn.cursor()
+    ok = True
+    try:
+        print(f"{'ratings':>9} {'changed':>8} {'full_ms':>9} {'incr_ms':>9} {'speedup':>8} {'check':>6}")
+        for n in (int(x) for x in args.ratings.split(",")):
+            seed(cur, n)
+            conn.commit()
+            full_rebuild(conn)
+            new_user = USERS
+            for d in (int(x) for x in args.deltas.split(",")):
+                change(cur, d, new_user)
+                new_user += d
+                conn.commit()
+                full_ms = timed(lambda: (cur.execute(VIEW_SQL), cur.fetchall()))
+                conn.commit()
+                incr_ms = timed(lambda: incremental(conn))
+                good = not check(conn, show=5)
+                ok &= good
+                print(f"{n:>9} {d:>8} {full_ms:>9.1f} {incr_ms:>9.1f} {full_ms / incr_ms:>7.1f}x "
+                      f"{'ok' if good else 'FAIL':>6}")
+    finally:
+        cur.close()
+        conn.close()
+
+    print("OK: incremental matches full aggregation" if ok else "FAIL: aggregate mismatch")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# backend/scripts/enrich_books/bench_ratelimit.py
+# Benchmark: pacing strategies against stub_api.py's quota windows.
+#   sleep    - the old per-call REQUEST_SLEEP_MS pause, each 429 only backs off its own call
+#   fixed    - shared TokenBucket at a fixed rate (the limiter before AIMD)
+#   adaptive - shared AdaptiveBucket (429 / Retry-After / latency feedback)
+# Every worker fetches editions in a loop; a 429 is retried until it succeeds.
+#   python bench_ratelimit.py [--seconds 30] [--workers 8] [--quota 50 --window 5]
+from __future__ import annotations
+
+import argparse, itertools, threading, time, urllib.error, urllib.request
+from typing import Callable, Optional, Tuple
+
+from ratelimit import AdaptiveBucket, TokenBucket, retry_after_seconds
+from stub_api import Quota, StubAPI
+
+
+def get(url: str) -> Tuple[int, float, Optional[str]]:
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as r:
+            r.read()
+            status, retry_after = r.status, None
+    except urllib.error.HTTPError as e:
+        status, retry_after = e.code, e.headers.get("Retry-After")
+    return status, time.perf_counter() - t0, retry_after
+
+
+def run(name: str, args, before: Callable[[int], None], after: Callable[[int, float, Optional[str]], None],
+        bucket: Optional[TokenBucket] = None):
+    stub = StubAPI(ol=Quota(args.quota, args.window, base_ms=args.latency_ms)).start()
+    isbns = itertools.count(9780000000000)
+    ok = throttled = 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.seconds
+
+    def worker():
+        nonlocal ok, throttled
+        attempt = 0
+        isbn = next(isbns)
+        while time.monotonic() < stop_at:
+            before(attempt)
+            status, dt, ra = get(f"{stub.url}/isbn/{isbn}.json")
+            after(status, dt, ra)
+            with lock:
+                if status == 429:
+                    throttled += 1
+                else:
+                    ok += 1
+            if status == 429:
+                attempt += 1
+            else:
+                attempt, isbn = 0, next(isbns)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    stub.stop()
+    rate = f"{bucket.rate:.1f}" if bucket is not None else "-"
+    print(f"{name:<22} {ok / args.seconds:>8.2f} {throttled:>6} {rate:>10}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=30)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--quota", type=int, default=50, help="requests per window")
+    ap.add_argument("--window", type=float, default=5)
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--sleep-ms", type=float, default=120, help="old REQUEST_SLEEP_MS")
+    ap.add_argument("--fixed", default="5,12", help="fixed token bucket rates to compare")
+    ap.add_argument("--start", type=float, default=5, help="adaptive start rate")
+    ap.add_argument("--max", type=float, default=20, help="adaptive ceiling")
+    args = ap.parse_args()
+    print(f"quota {args.quota}/{args.window:g}s = {args.quota / args.window:.1f} req/s, {args.workers} workers")
+    print(f"{'strategy':<22} {'ok/s':>8} {'429s':>6} {'final rate':>10}")
+
+    def backoff(attempt: int):  # tenacity-style, own call only
+        time.sleep(args.sleep_ms / 1000 + (min(30.0, 0.75 * 2 ** attempt) if attempt else 0))
+    run(f"sleep {args.sleep_ms:g}ms", args, backoff, lambda *a: None)
+
+    for r in (float(x) for x in args.fixed.split(",") if x):
+        b = TokenBucket(r)
+        run(f"fixed {r:g}/s", args, lambda _a, b=b: b.acquire(), lambda *a: None, b)
+
+    a = AdaptiveBucket(args.start, max_rate=args.max)
+    run(f"adaptive {args.start:g}..{args.max:g}/s", args, lambda _a: a.acquire(),
+        lambda status, dt, ra: a.feedback(status, dt, retry_after_seconds(ra)), a)
+
+
+if __name__ == "__main__":
+    main()
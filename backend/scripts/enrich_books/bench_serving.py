@@ -0,0 +1,106 @@
+# backend/scripts/enrich_books/bench_serving.py
+# Benchmark: recall@N vs latency of the mmap serving index against exact
+# pgvector search (sequential scan, ORDER BY embedding <=> q) and the
+# ivfflat index as deployed. Queries are random indexed books ("more like
+# this"), optionally with the genre / page_count filter applied on both sides.
+#   python bench_serving.py [--index serve_index] [--queries 200] [-n 10]
+#                           [--nprobe 1,2,4,8,16,32] [--genres Fantasy] [--max-pages 400]
+from __future__ import annotations
+
+import argparse, time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db import connect
+from serve_index import SERVE_DIR, ServingIndex
+
+
+def pg_search(cur, book_id: int, vec: str, n: int, exact: bool,
+              genres: Sequence[str], min_pages: Optional[int], max_pages: Optional[int]) -> List[int]:
+    where, params = ["embedding IS NOT NULL", "id <> %s"], [book_id]
+    if genres:
+        where.append("genres && %s::text[]"); params.append(list(genres))
+    if min_pages is not None:
+        where.append("page_count >= %s"); params.append(min_pages)
+    if max_pages is not None:
+        where.append("page_count <= %s"); params.append(max_pages)
+    cur.execute("SET LOCAL enable_indexscan = %s", ("off" if exact else "on",))
+    cur.execute(f"SELECT id FROM books WHERE {' AND '.join(where)} "
+                f"ORDER BY embedding <=> %s::vector LIMIT %s", params + [vec, n])
+    return [r[0] for r in cur.fetchall()]
+
+
+def run(name: str, queries, fn: Callable[[int, int], List[int]], truth) -> Tuple[str, float, float, float]:
+    lat, rec = [], []
+    for (book_id, row), want in zip(queries, truth):
+        t0 = time.perf_counter()
+        got = fn(book_id, row)
+        lat.append((time.perf_counter() - t0) * 1000)
+        rec.append(len(set(got) & set(want)) / max(1, len(want)))
+    return name, float(np.mean(rec)), float(np.percentile(lat, 50)), float(np.percentile(lat, 99))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index", default=SERVE_DIR)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-n", type=int, default=10)
+    ap.add_argument("--nprobe", default="1,2,4,8,16,32")
+    ap.add_argument("--genres", default="")
+    ap.add_argument("--min-pages", type=int)
+    ap.add_argument("--max-pages", type=int)
+    args = ap.parse_args()
+    genres = [g for g in args.genres.split(",") if g]
+    flt = dict(genres=genres, min_pages=args.min_pages, max_pages=args.max_pages)
+
+    t0 = time.perf_counter()
+    idx = ServingIndex(args.index)
+    print(f"open: {(time.perf_counter() - t0) * 1000:.2f} ms ({idx.meta['n']} books, {idx.meta['dtype']})")
+
+    rnd = np.random.default_rng(11)
+    rows = rnd.choice(idx.meta["n"], min(args.queries, idx.meta["n"]), replace=False)
+    queries = [(int(idx.ids[r]), int(r)) for r in rows]
+
+    conn = connect()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, embedding::text FROM books WHERE id = ANY(%s)", ([b for b, _ in queries],))
+        vecs = dict(cur.fetchall())
+        conn.commit()
+        queries = [(b, r) for b, r in queries if b in vecs]
+
+        truth = []
+        for b, _ in queries:
+            truth.append(pg_search(cur, b, vecs[b], args.n, True, **flt))
+            conn.commit()
+
+        def pg(exact):
+            def fn(b, _r):
+                ids = pg_search(cur, b, vecs[b], args.n, exact, **flt)
+                conn.commit()
+                return ids
+            return fn
+
+        results = [run("pgvector exact", queries, pg(True), truth),
+                   run("pgvector ivfflat", queries, pg(False), truth)]
+    finally:
+        cur.close()
+        conn.close()
+
+    from embed_books import parse_vector
+    qv = {b: parse_vector(v) for b, v in vecs.items()}
+    results.append(run("mmap neighbours", queries,
+                       lambda b, r: [h for h, _ in idx.similar(b, args.n, **flt)], truth))
+    for p in (int(x) for x in args.nprobe.split(",")):
+        results.append(run(f"mmap ivf nprobe={p}", queries,
+                           lambda b, r: [h for h, _ in idx.search(qv[b], args.n, p, exclude_rows=[r], **flt)],
+                           truth))
+
+    print(f"{'method':<22} {'recall@' + str(args.n):>9} {'p50_ms':>8} {'p99_ms':>8}")
+    for name, recall, p50, p99 in results:
+        print(f"{name:<22} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# backend/scripts/enrich_books/bench_upsert.py
+# Benchmark: execute_batch UPDATEs vs COPY + set-based UPDATE.
+# Runs against a session-local TEMP "books" table (shadows public.books for
+# this connection only), so it is safe to point at the dev database.
+#   python bench_upsert.py [--sizes 500,5000,50000]
+from __future__ import annotations
+
+import argparse, random, time
+from typing import List, Optional, Tuple
+
+from db import connect
+from enrich_books import upsert_enrichment, upsert_enrichment_copy
+
+Row = Tuple[Optional[int], List[str], Optional[str], str, dict]
+GENRES = ["Fiction", "Fantasy", "Sci-Fi", "History", "Romance", "Mystery", "Poetry", "Art"]
+
+
+def make_rows(n: int, rnd: random.Random) -> List[Row]:
+    rows = []
+    for i in range(n):
+        isbn = f"978{i:010d}"
+        if rnd.random() < 0.2:  # attempt-only row (nothing learned)
+            rows.append((None, [], None, isbn, {"failed": {"google": ["page_count"]}}))
+            continue
+        p = rnd.choice([None, rnd.randint(40, 1200)])
+        g = rnd.sample(GENRES, rnd.randint(0, 3))
+        d = rnd.choice([None, 'He said "hi", then \\ left.\n' * rnd.randint(1, 20)])
+        prov = {}
+        if p: prov["page_count"] = {"src": "openlibrary", "conf": 0.9, "via": "number_of_pages"}
+        if g: prov["genres"] = {"src": "google", "conf": 0.8, "via": "volumes"}
+        if d: prov["description"] = {"src": "openlibrary", "conf": 0.8, "via": "work"}
+        rows.append((p, g, d, isbn, prov))
+    return rows
+
+
+def seed(cur, n: int) -> None:
+    cur.execute("""
+        CREATE TEMP TABLE books (
+          id              bigserial PRIMARY KEY,
+          isbn13          text UNIQUE,
+          description     text,
+          genres          text[] DEFAULT '{}',
+          page_count      int,
+          page_count_source     text,
+          page_count_confidence real,
+          genre_source          text,
+          genre_confidence      real,
+          enrichment_src  jsonb,
+          enriched_at     timestamptz,
+          last_attempt_at timestamptz,
+          attempt_count   int DEFAULT 0,
+          lease_owner     text,
+          lease_until     timestamptz
+        )
+    """)
+    cur.execute("""
+        INSERT INTO books (isbn13, genres, page_count)
+        SELECT '978' || lpad(g::text, 10, '0'),
+               CASE WHEN g %% 3 = 0 THEN ARRAY['Travel'] ELSE '{}' END,
+               CASE WHEN g %% 4 = 0 THEN 100 END
+        FROM generate_series(0, %s - 1) g
+    """, (n,))
+    cur.execute("ANALYZE books")
+
+
+def snapshot(cur):
+    cur.execute("""SELECT isbn13, page_count, genres, description, page_count_source, page_count_confidence,
+                          genre_source, genre_confidence, enrichment_src::text, enriched_at IS NOT NULL,
+                          last_attempt_at IS NOT NULL, attempt_count
+                   FROM books ORDER BY isbn13""")
+    return cur.fetchall()
+
+
+def run(conn, fn, rows: List[Row]):
+    cur = conn.cursor()
+    try:
+        seed(cur, len(rows))
+        t0 = time.perf_counter()
+        fn(cur, rows)
+        elapsed = time.perf_counter() - t0
+        return elapsed, snapshot(cur)
+    finally:
+        conn.rollback()  # drops the temp table too
+        cur.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="500,5000,50000")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    conn = connect()
+    try:
+        print(f"{'rows':>8} {'execute_batch':>14} {'copy':>10} {'speedup':>8}  same result")
+        for n in (int(x) for x in args.sizes.split(",")):
+            rows = make_rows(n, random.Random(args.seed))
+            t_batch, s_batch = run(conn, upsert_enrichment, rows)
+            t_copy, s_copy = run(conn, upsert_enrichment_copy, rows)
+            print(f"{n:>8} {t_batch:>13.3f}s {t_copy:>9.3f}s {t_batch / t_copy:>7.1f}x  {s_batch == s_copy}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
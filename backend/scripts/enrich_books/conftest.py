@@ -0,0 +1,11 @@
+# backend/scripts/enrich_books/conftest.py
+# pytest from this directory: the scripts import each other as top-level
+# modules (this directory is put on sys.path), tests live in tests/.
+#   python -m pytest -q
+import os
+
+# enrich_books reads its config at import: no HTTP cache file next to the scripts
+os.environ["HTTP_CACHE_PATH"] = ""
+
+# manual connectivity check, not a test (connects at import)
+collect_ignore = ["test_pg.py"]
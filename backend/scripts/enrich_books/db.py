@@ -0,0 +1,187 @@
+# backend/scripts/enrich_books/db.py
+# Shared Postgres access for the scripts in this directory: one config
+# loader, a health-checked connection pool and streaming cursors.
+from __future__ import annotations
+
+import itertools, os, sys, threading, time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+import psycopg2, psycopg2.extensions
+from dotenv import find_dotenv, load_dotenv
+
+T = TypeVar("T")
+
+# ---------------- config ----------------
+load_dotenv(find_dotenv())
+
+def _env(primary: str, alt: str, default: Optional[str] = None) -> Optional[str]:
+    """libpq's PG* name wins, then the project's PG_* name, then the default."""
+    return os.getenv(primary, os.getenv(alt, default))
+
+PG = dict(
+    host=_env("PGHOST", "PG_HOST", "localhost"),
+    port=int(_env("PGPORT", "PG_PORT", "5432")),
+    dbname=_env("PGDATABASE", "PG_DB", "reading"),
+    user=_env("PGUSER", "PG_USER", "app"),
+    password=_env("PGPASSWORD", "PG_PASSWORD", "app"),
+)
+
+DB_POOL_MAX        = int(os.getenv("DB_POOL_MAX", "4"))           # connections per process
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))   # s
+DB_IDLE_CHECK_SEC  = float(os.getenv("DB_IDLE_CHECK_SEC", "30"))  # ping pooled connections idle longer than this
+DB_RETRIES         = int(os.getenv("DB_RETRIES", "5"))            # Pool.run attempts after a dropped connection
+DB_STREAM_ROWS     = int(os.getenv("DB_STREAM_ROWS", "10000"))    # rows per server-side cursor round trip
+
+# TCP keepalives: a dead server/NAT drop surfaces as an error within ~1 min
+# instead of a socket read that never returns
+CONNECT_ARGS = dict(
+    connect_timeout=DB_CONNECT_TIMEOUT,
+    keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+    application_name=os.path.basename(sys.argv[0] or "enrich_books")[:63],
+)
+
+# what link-level failures (connection lost, server restarted, admin shutdown,
+# ...) raise. OperationalError also covers deadlocks, statement timeouts and
+# cancels on a live connection: see dropped()
+DISCONNECTS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def connect(**overrides):
+    conn = psycopg2.connect(**{**PG, **CONNECT_ARGS, **overrides})
+    conn.autocommit = False
+    return conn
+
+
+def healthy(conn) -> bool:
+    """Round trip on an idle connection (ends its transaction)."""
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except DISCONNECTS:
+        return False
+
+
+def dropped(e: BaseException, conn) -> bool:
+    """Did `e` take the connection down (conn None = could not connect)?"""
+    return isinstance(e, psycopg2.InterfaceError) or conn is None or bool(conn.closed)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# ---------------- pool ----------------
+class Pool:
+    """
+    Thread-safe pool of up to `maxconn` connections. Connections idle longer
+    than DB_IDLE_CHECK_SEC are pinged on checkout and replaced if dead;
+    connections returned closed (or that fail to roll back) are dropped.
+    """
+
+    def __init__(self, maxconn: int = DB_POOL_MAX, **overrides):
+        self._overrides = overrides
+        self._idle: List[Tuple[object, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, maxconn))
+
+    def getconn(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return connect(**self._overrides)
+                conn, since = item
+                if not conn.closed and (time.monotonic() - since < DB_IDLE_CHECK_SEC or healthy(conn)):
+                    return conn
+                _close(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if not conn.closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()  # never hand out a connection mid-transaction
+                except DISCONNECTS:
+                    pass
+            if conn.closed:
+                _close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[object]:
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def run(self, fn: Callable[[object], T], retries: int = DB_RETRIES) -> T:
+        """
+        fn(conn) as one transaction, committed on return. If the connection
+        drops, the transaction is rolled back server-side and fn is retried
+        on a fresh connection -> fn must be idempotent. Errors on a live
+        connection (deadlock, statement timeout, cancel, ...) are raised.
+        """
+        for attempt in range(retries + 1):
+            conn = None
+            try:
+                with self.connection() as conn:
+                    out = fn(conn)
+                    conn.commit()
+                    return out
+            except DISCONNECTS as e:
+                if attempt == retries or not dropped(e, conn):
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt)
+                print(f"DB error ({type(e).__name__}: {str(e).strip()[:120]}); retrying in {delay:.1f}s",
+                      file=sys.stderr)
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close(conn)
+
+
+# ---------------- streaming ----------------
+_cursor_ids = itertools.count(1)
+
+def stream(conn, sql: str, params=None, itersize: int = DB_STREAM_ROWS,
+           name: Optional[str] = None) -> Iterator[tuple]:
+    """Rows of `sql` via a named server-side cursor: memory bounded by `itersize`, not the result size."""
+    with conn.cursor(name=name or f"stream_{next(_cursor_ids)}") as cur:
+        cur.itersize = itersize
+        cur.execute(sql, params)
+        yield from cur
+
+
+def stream_batches(conn, sql: str, params=None, size: int = DB_STREAM_ROWS,
+                   name: Optional[str] = None) -> Iterator[List[tuple]]:
+    """Like stream(), in lists of up to `size` rows (for vectorised consumers)."""
+    with conn.cursor(name=name or f"stream_{next(_cursor_ids)}") as cur:
+        cur.itersize = size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                return
+            yield rows
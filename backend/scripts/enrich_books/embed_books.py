@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/embed_books.py
+# Fill books.embedding (VECTOR(384), MiniLM) for rows that have none, whose
+# text changed since they were last encoded, or that were encoded with another
+# EMBED_MODEL. Resumable: every flush commits and encoded rows drop out of the
+# selection.
+#   python embed_books.py [--max-rows N]
+from __future__ import annotations
+
+import argparse, hashlib, io, os, time
+from typing import Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from db import Pool
+from pipeline import run_pipeline
+
+EMBED_MODEL    = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_DIM      = 384                                   # must match books.embedding VECTOR(384)
+EMBED_BATCH    = int(os.getenv("EMBED_BATCH", "2048"))  # rows per DB read / write
+ENCODE_BATCH   = int(os.getenv("ENCODE_BATCH", "128"))  # sentences per forward pass
+EMBED_THREADS  = int(os.getenv("EMBED_THREADS", "0"))   # torch intra-op threads (0 = torch default)
+MAX_TEXT_CHARS = 2000                                  # MiniLM truncates at 256 tokens anyway
+MODEL_TAG      = f"{EMBED_MODEL}@{EMBED_DIM}"             # books.embedding_model; part of every text hash
+
+# id, title, author, description, genres, hash, has embedding
+Row = Tuple[int, str, str, Optional[str], Optional[List[str]], Optional[str], bool]
+
+
+def ensure_embedding_schema(cur):
+    cur.execute("""
+        ALTER TABLE books
+          ADD COLUMN IF NOT EXISTS enriched_at    timestamptz,  -- also added by enrich_books.ensure_schema
+          ADD COLUMN IF NOT EXISTS embedded_at    timestamptz,
+          ADD COLUMN IF NOT EXISTS embedding_hash text,
+          ADD COLUMN IF NOT EXISTS embedding_model text;
+    """)
+    # TODO_SQL's OR predicate never implies "embedding IS NULL": the partial index was dead weight
+    cur.execute("DROP INDEX IF EXISTS idx_books_embedding_todo;")
+
+
+def book_text(title: str, author: str, description: Optional[str], genres: Optional[List[str]]) -> str:
+    parts = [f"{title} by {author}."]
+    if genres: parts.append("Genres: " + ", ".join(genres) + ".")
+    if description: parts.append(description)
+    return " ".join(parts)[:MAX_TEXT_CHARS]
+
+
+def text_hash(text: str) -> str:
+    """Covers the model too: a new EMBED_MODEL invalidates every stored vector."""
+    return hashlib.md5(f"{MODEL_TAG}\n{text}".encode("utf-8")).hexdigest()
+
+
+def vector_literal(v) -> str:
+    """pgvector text input, e.g. '[0.1,-0.2]'."""
+    return "[" + ",".join(f"{x:.6g}" for x in v) + "]"
+
+
+def parse_vector(s: str):
+    """pgvector text output -> float32 ndarray."""
+    import numpy as np
+    return np.fromstring(s[1:-1], dtype=np.float32, sep=",")
+
+
+# missing vector, other model, or enriched after the last encoding (hash decides if it really changed)
+TODO_SQL = """
+  SELECT id, title, author, description, genres, embedding_hash, embedding IS NOT NULL
+  FROM books
+  WHERE id > %s
+    AND (embedding IS NULL OR embedding_model IS DISTINCT FROM %s
+         OR embedded_at IS NULL OR enriched_at > embedded_at)
+  ORDER BY id
+  LIMIT %s
+"""
+
+def iter_todo(pool: Pool, max_rows: Optional[int]) -> Iterator[List[Row]]:
+    """Keyset-paged batches of rows needing (re-)encoding; runs on the producer thread."""
+    def page(last_id: int, limit: int) -> List[Row]:
+        def read(conn):
+            with conn.cursor() as cur:
+                cur.execute(TODO_SQL, (last_id, MODEL_TAG, limit))
+                return cur.fetchall()
+        return pool.run(read)
+
+    last_id, seen = 0, 0
+    while max_rows is None or seen < max_rows:
+        rows = page(last_id, EMBED_BATCH if max_rows is None else min(EMBED_BATCH, max_rows - seen))
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        seen += len(rows)
+        yield rows
+
+
+class Encoder:
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise SystemExit("embed_books.py needs the ML extras: pip install -r requirements-ml.txt") from e
+        if EMBED_THREADS > 0:
+            import torch
+            torch.set_num_threads(EMBED_THREADS)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        dim = self.model.get_sentence_embedding_dimension()
+        if dim != EMBED_DIM:
+            raise SystemExit(f"{model_name} produces {dim}-d vectors, books.embedding is VECTOR({EMBED_DIM})")
+
+    def __call__(self, rows: List[Row]) -> List[Tuple[int, Optional[str], str]]:
+        """-> (id, pgvector literal or None if text unchanged, text hash)"""
+        out, todo, texts = [], [], []
+        for id_, title, author, desc, genres, old_hash, has_vec in rows:
+            t = book_text(title, author, desc, genres)
+            h = text_hash(t)
+            if h == old_hash and has_vec:
+                out.append((id_, None, h))  # text and model unchanged: only stamp embedded_at
+            else:
+                todo.append((id_, h)); texts.append(t)
+        if texts:
+            vecs = self.model.encode(texts, batch_size=ENCODE_BATCH, normalize_embeddings=True,
+                                     convert_to_numpy=True, show_progress_bar=False)
+            for (id_, h), v in zip(todo, vecs):
+                out.append((id_, vector_literal(v), h))
+        return out
+
+
+def write_embeddings(cur, rows: List[Tuple[int, Optional[str], str]]):
+    """COPY (id, vector text, hash) into a temp table, then one UPDATE ... FROM."""
+    buf = io.StringIO()
+    for id_, vec, h in rows:
+        buf.write(f"{id_}\t{vec if vec is not None else chr(92) + 'N'}\t{h}\n")
+    buf.seek(0)
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS tmp_embeddings (
+          id        bigint,
+          embedding text,
+          hash      text
+        )
+    """)
+    cur.execute("TRUNCATE tmp_embeddings")
+    cur.copy_expert("COPY tmp_embeddings (id, embedding, hash) FROM STDIN", buf)
+    cur.execute("""
+        UPDATE books b
+        SET embedding       = COALESCE(t.embedding::vector, b.embedding),
+            embedding_hash  = t.hash,
+            embedding_model = %s,
+            embedded_at     = NOW()
+        FROM tmp_embeddings t
+        WHERE b.id = t.id
+    """, (MODEL_TAG,))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Encode books into books.embedding with a local MiniLM model.")
+    ap.add_argument("--max-rows", type=int, default=0, help="stop after N rows (0 = all)")
+    args = ap.parse_args()
+
+    encode = Encoder(EMBED_MODEL)
+    pool = Pool(maxconn=2)  # page reader + writer
+    def schema(conn):
+        with conn.cursor() as cur:
+            ensure_embedding_schema(cur)
+    pool.run(schema)
+
+    bar = tqdm(desc="Embedding", unit="rows")
+    t0, done, encoded = time.perf_counter(), 0, 0
+
+    def flush(conn, batch):
+        with conn.cursor() as cur:
+            write_embeddings(cur, batch)
+
+    def write(batch):
+        nonlocal done, encoded
+        pool.run(lambda conn: flush(conn, batch))  # idempotent: replayed if the connection drops
+        done += len(batch)
+        encoded += sum(1 for _, v, _ in batch if v is not None)
+        bar.update(len(batch))
+        bar.set_postfix(rows_per_s=f"{done / (time.perf_counter() - t0):.0f}")
+
+    try:
+        # DB read (producer) and DB write (here) overlap with encoding; one
+        # encoder thread, torch already parallelises each forward pass
+        run_pipeline(iter_todo(pool, args.max_rows or None), encode, write,
+                     workers=1, queue_size=2, flush_rows=EMBED_BATCH, flush_sec=30, flatten=True)
+    finally:
+        bar.close()
+        pool.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"Done. {done} rows ({encoded} encoded, {done - encoded} unchanged) "
+          f"in {elapsed:.0f}s, {done / max(elapsed, 1e-9):.0f} rows/s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -284,39 +284,108 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import os, re, time
-from typing import List, Optional, Tuple
+import argparse, csv, hashlib, io, json, os, re, signal, socket, sys, threading, time
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+from urllib.parse import urlparse
 from requests import exceptions as req_exc
 
-import psycopg2, psycopg2.extras
+import psycopg2.extras
 import requests
-from dotenv import load_dotenv, find_dotenv
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from tqdm import tqdm
 
-# ---------------- config / env ----------------
-load_dotenv(find_dotenv())
+from db import Pool, stream
+from genres import normalize_genres  # GENRE_MAP lives in genres.py now
+from http_cache import ResponseCache
+from isbn import ISBN_OK_SQL, isbn13
+from journal import Journal
+from metrics import Metrics, Reporter
+from ol_dump import scan_editions, scan_works
+from pipeline import run_pipeline
+from ratelimit import AdaptiveBucket, HostLimiters, TokenBucket, retry_after_seconds
 
-def _env(primary: str, alt: str, default: Optional[str] = None) -> Optional[str]:
-    return os.getenv(primary, os.getenv(alt, default))
+T = TypeVar("T")
 
-PG = dict(
-    host=_env("PGHOST", "PG_HOST", "localhost"),
-    port=int(_env("PGPORT", "PG_PORT", "5432")),
-    dbname=_env("PGDATABASE", "PG_DB", "reading"),
-    user=_env("PGUSER", "PG_USER", "app"),
-    password=_env("PGPASSWORD", "PG_PASSWORD", "app"),
-)
+# ---------------- config / env ----------------
+# .env and the PG connection settings are loaded by db.py
 
-BATCH_SIZE            = int(os.getenv("BATCH_SIZE", "500"))
+BATCH_SIZE            = int(os.getenv("BATCH_SIZE", "500"))    # candidates per queue read
+FLUSH_ROWS            = int(os.getenv("FLUSH_ROWS", str(BATCH_SIZE)))  # write+commit every N results ...
+FLUSH_SEC             = float(os.getenv("FLUSH_SEC", "15"))            # ... or every T seconds
 MAX_BOOKS             = int(os.getenv("MAX_BOOKS", "0"))     # 0 = all
-SLEEP_MS              = int(os.getenv("REQUEST_SLEEP_MS", "120"))
+CONCURRENCY           = int(os.getenv("CONCURRENCY", "8"))       # requests in flight
+OL_RATE_PER_SEC       = float(os.getenv("OL_RATE_PER_SEC", "5"))  # openlibrary.org budget (0 = unlimited)
+GB_RATE_PER_SEC       = float(os.getenv("GB_RATE_PER_SEC", "2"))  # googleapis.com budget (0 = unlimited)
+RATE_ADAPTIVE         = os.getenv("RATE_ADAPTIVE", "1") == "1"   # AIMD: rates above are start points, not caps
+OL_RATE_MAX           = float(os.getenv("OL_RATE_MAX", "20"))     # adaptive ceilings
+GB_RATE_MAX           = float(os.getenv("GB_RATE_MAX", "8"))
+RATE_MIN              = float(os.getenv("RATE_MIN", "0.2"))       # adaptive floor
+RATE_LATENCY_MS       = float(os.getenv("RATE_LATENCY_MS", "1500"))  # slower answers stop the increase
+OL_BASE_URL           = os.getenv("OL_BASE_URL", "https://openlibrary.org").rstrip("/")      # stub_api.py for local runs
+GB_BASE_URL           = os.getenv("GB_BASE_URL", "https://www.googleapis.com").rstrip("/")
 ATTEMPT_COOLDOWN_MIN  = int(os.getenv("ATTEMPT_COOLDOWN_MIN", "60"))  # don’t retry same ISBN inside this window
 GOOGLE_API_KEY        = os.getenv("GOOGLE_API_KEY")  # optional
+HTTP_CACHE_PATH       = os.getenv("HTTP_CACHE_PATH",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache.sqlite"))
+HTTP_CACHE_TTL_DAYS   = float(os.getenv("HTTP_CACHE_TTL_DAYS", "90"))     # 0 = never expires
+HTTP_CACHE_404_DAYS   = float(os.getenv("HTTP_CACHE_404_DAYS", "14"))     # negative entries
+HTTP_CACHE_MAX_MB     = int(os.getenv("HTTP_CACHE_MAX_MB", "2048"))       # 0 = no cap
+OL_BATCH              = int(os.getenv("OL_BATCH", "50"))      # ISBNs per OpenLibrary api/books?bibkeys= call
+GB_BATCH              = int(os.getenv("GB_BATCH", "10"))      # ISBNs per Google "isbn:a OR isbn:b" query (1 = off)
+LEASE_MIN             = int(os.getenv("LEASE_MIN", "30"))    # --worker: claimed rows are reclaimable after this
+WORKER_RESCANS        = int(os.getenv("WORKER_RESCANS", "1"))  # --worker: passes back to the queue head once drained
+WORKER_ID             = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+WRITE_MODE            = os.getenv("WRITE_MODE", "batch")  # batch = execute_batch UPDATEs, copy = COPY + one UPDATE
+METRICS_LOG_SEC       = float(os.getenv("METRICS_LOG_SEC", "30"))  # JSON progress line interval (0 = off)
+METRICS_FILE          = os.getenv("METRICS_FILE")                # Prometheus textfile, rewritten each interval
+METRICS_PORT          = int(os.getenv("METRICS_PORT", "0"))      # serve /metrics on this port (0 = off)
+METRICS_HOST          = os.getenv("METRICS_HOST", "127.0.0.1")   # bind address; 0.0.0.0 exposes it on every interface
+REFRESH_MIN_AGE_DAYS  = float(os.getenv("REFRESH_MIN_AGE_DAYS", "30"))  # --refresh: skip sources checked more recently
+JOURNAL_PATH          = os.getenv("JOURNAL_PATH",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), ".enrich_journal.jsonl"))
+JOURNAL_FSYNC         = os.getenv("JOURNAL_FSYNC", "1") == "1"   # fetch worker fsyncs each chunk before queueing it
+OFFLINE               = False  # --offline: answer from HTTP cache only, never hit the network
 
 # ---------------- HTTP helpers ----------------
-SESSION = requests.Session()
-SESSION.headers.update({"User-Agent": "licenta-enrichment/1.0 (contact: you@example.local)"})
+USER_AGENT = "licenta-enrichment/1.0 (contact: you@example.local)"
+_tls = threading.local()
+
+def _session() -> requests.Session:
+    # requests.Session is not safe to share across threads -> one per worker
+    s = getattr(_tls, "session", None)
+    if s is None:
+        s = requests.Session()
+        s.headers.update({"User-Agent": USER_AGENT})
+        _tls.session = s
+    return s
+
+def _bucket(rate: float, max_rate: float) -> TokenBucket:
+    if not RATE_ADAPTIVE or rate <= 0:
+        return TokenBucket(rate)
+    return AdaptiveBucket(rate, min_rate=min(RATE_MIN, rate), max_rate=max_rate,
+                          latency_target=RATE_LATENCY_MS / 1000)
+
+def _limit_key(base_url: str) -> str:
+    return re.sub(r"^www\.", "", urlparse(base_url).netloc.lower())
+
+# one bucket per upstream, shared by all fetcher threads
+LIMITERS = HostLimiters({
+    _limit_key(OL_BASE_URL): _bucket(OL_RATE_PER_SEC, OL_RATE_MAX),
+    _limit_key(GB_BASE_URL): _bucket(GB_RATE_PER_SEC, GB_RATE_MAX),
+})
+
+# HTTP_CACHE_PATH= (empty) disables the cache
+CACHE = ResponseCache(HTTP_CACHE_PATH, HTTP_CACHE_TTL_DAYS * 86400, HTTP_CACHE_404_DAYS * 86400,
+                      HTTP_CACHE_MAX_MB * 1024 * 1024) if HTTP_CACHE_PATH else None
+
+METRICS = Metrics()
+METRICS.describe("http_request_seconds", "Upstream HTTP latency per attempt")
+METRICS.describe("http_responses", "Upstream HTTP responses by status code (error = network failure)")
+METRICS.describe("http_retries", "Attempts retried by tenacity")
+METRICS.describe("books", "ISBN candidates by outcome")
+
+def _host(url: str) -> str:
+    return urlparse(url).hostname or "?"
 
 class TransientHTTP(Exception): pass
 
@@ -324,14 +393,27 @@ class TransientHTTP(Exception): pass
     retry=retry_if_exception_type(TransientHTTP),
     wait=wait_exponential(multiplier=0.75, min=1, max=30),
     stop=stop_after_attempt(6),
+    before_sleep=lambda rs: METRICS.inc("http_retries", host=_host(rs.args[0])),
 )
-def http_json(url: str, timeout=30) -> dict:
+def _get(url: str, timeout=30, headers: Optional[dict] = None) -> requests.Response:
+    LIMITERS.acquire(url)  # every attempt (incl. retries) spends a token
+    host, t0 = _host(url), time.perf_counter()
     try:
-        r = SESSION.get(url, timeout=timeout)
+        r = _session().get(url, timeout=timeout, headers=headers)
     except (req_exc.Timeout, req_exc.ConnectionError, req_exc.SSLError, req_exc.ProxyError) as e:
+        LIMITERS.feedback(url, None, time.perf_counter() - t0)
+        METRICS.inc("http_responses", host=host, code="error")
         raise TransientHTTP(f"network error: {e}")
+    dt = time.perf_counter() - t0
+    # a 429 / Retry-After slows every fetcher of this host, not just this call
+    LIMITERS.feedback(url, r.status_code, dt, retry_after_seconds(r.headers.get("Retry-After")))
+    METRICS.observe("http_request_seconds", dt, host=host)
+    METRICS.inc("http_responses", host=host, code=r.status_code)
     if r.status_code >= 500 or r.status_code == 429:
         raise TransientHTTP(f"{r.status_code} from {url}")
+    return r
+
+def _json(r: requests.Response) -> dict:
     if r.status_code != 200:
         return {}
     try:
@@ -339,39 +421,43 @@ def http_json(url: str, timeout=30) -> dict:
     except Exception:
         return {}
 
-# ---------------- ISBN & genres ----------------
-ISBN10_RE = re.compile(r"^[0-9]{9}[0-9Xx]$")
-ISBN13_RE = re.compile(r"^[0-9]{13}$")
-
-def isbn13(s: str) -> Optional[str]:
-    if not s: return None
-    s = re.sub(r"[^0-9Xx]", "", s)
-    if ISBN13_RE.match(s): return s
-    if ISBN10_RE.match(s):
-        core = "978" + s[:9]
-        total = sum((int(core[i]) * (3 if i % 2 else 1)) for i in range(12))
-        check = (10 - (total % 10)) % 10
-        return core + str(check)
-    return None
+def _fetch_json(url: str, timeout=30) -> Tuple[int, dict]:
+    r = _get(url, timeout)
+    return r.status_code, _json(r)
 
-GENRE_MAP = {
-    "fiction":"Fiction","nonfiction":"Non-Fiction","fantasy":"Fantasy",
-    "science fiction":"Sci-Fi","sci-fi":"Sci-Fi","ya":"Young Adult","young adult":"Young Adult",
-    "romance":"Romance","mystery":"Mystery","thriller":"Thriller","horror":"Horror",
-    "historical":"Historical","history":"History","biography":"Biography","memoir":"Memoir",
-    "self-help":"Self-Help","business":"Business","philosophy":"Philosophy","poetry":"Poetry",
-    "children":"Children","graphic novels":"Comics/Graphic","comics":"Comics/Graphic",
-    "technology":"Technology","computer":"Technology","programming":"Technology",
-    "science":"Science","math":"Math","religion":"Religion","art":"Art","travel":"Travel",
-}
+def fetch_conditional(url: str, etag: Optional[str], last_modified: Optional[str],
+                      timeout=30) -> Tuple[int, dict, Optional[str], Optional[str]]:
+    """GET with If-None-Match / If-Modified-Since -> (status, json, etag, last_modified); 304 = unchanged."""
+    headers = {}
+    if etag: headers["If-None-Match"] = etag
+    if last_modified: headers["If-Modified-Since"] = last_modified
+    r = _get(url, timeout, headers)
+    return (r.status_code, _json(r),
+            r.headers.get("ETag") or etag, r.headers.get("Last-Modified") or last_modified)
 
-def normalize_genres(labels: List[str]) -> List[str]:
-    out = set()
-    for raw in labels or []:
-        s = raw.strip().lower()
-        for k,v in GENRE_MAP.items():
-            if k in s: out.add(v)
-    return sorted(out)
+def cache_lookup(url: str) -> Optional[dict]:
+    if CACHE is None:
+        return None
+    hit = CACHE.get(url, allow_stale=OFFLINE)
+    METRICS.inc("http_cache", result="hit" if hit is not None else "miss")
+    return hit[1] if hit is not None else None
+
+def remember(url: str, status: int, data: dict):
+    if CACHE is not None:
+        CACHE.put(url, status, data)  # 200 + 404 only
+
+def http_json(url: str, timeout=30) -> dict:
+    hit = cache_lookup(url)
+    if hit is not None:
+        return hit
+    if OFFLINE:
+        return {}
+    status, data = _fetch_json(url, timeout)
+    remember(url, status, data)
+    return data
+
+# ---------------- ISBN & genres ----------------
+# isbn13 / ISBN_OK_SQL live in isbn.py (shared with load_bx.py)
 
 def pick_best_int(*vals: Optional[int]) -> Optional[int]:
     for v in vals:
@@ -379,8 +465,22 @@ def pick_best_int(*vals: Optional[int]) -> Optional[int]:
     return None
 
 # ---------------- source adapters ----------------
-def from_openlibrary(isbn: str) -> Tuple[Optional[int], List[str], Optional[str]]:
-    b = http_json(f"https://openlibrary.org/isbn/{isbn}.json")
+Fields = Tuple[Optional[int], List[str], Optional[str]]  # (page_count, genres, description)
+
+def ol_edition_url(isbn: str) -> str:
+    return f"{OL_BASE_URL}/isbn/{isbn}.json"
+
+def ol_work_url(work_key: str) -> str:
+    return f"{OL_BASE_URL}{work_key}.json"
+
+def gb_url(query: str, **params) -> str:
+    url = f"{GB_BASE_URL}/books/v1/volumes?q={query}"
+    for k, v in params.items(): url += f"&{k}={v}"
+    if GOOGLE_API_KEY: url += f"&key={GOOGLE_API_KEY}"
+    return url
+
+def _ol_edition_fields(b: dict):
+    """edition JSON -> (pages, subjects, description, first work key)"""
     pages = b.get("number_of_pages")
     if not pages:
         pag = b.get("pagination")
@@ -395,25 +495,24 @@ def from_openlibrary(isbn: str) -> Tuple[Optional[int], List[str], Optional[str]
     if isinstance(desc, dict): desc = desc.get("value")
     description = desc.strip() if isinstance(desc, str) else None
 
-    if not description or not subjects:
-        works = b.get("works") or []
-        if works and isinstance(works[0], dict) and "key" in works[0]:
-            wk = http_json(f"https://openlibrary.org{works[0]['key']}.json")
-            if not description:
-                d = wk.get("description")
-                description = (d.get("value") if isinstance(d, dict) else d) if d else None
-            if not subjects:
-                subs = wk.get("subjects") or []
-                subjects = [s for s in subs if isinstance(s, str)]
-
-    genres = normalize_genres(subjects)
+    works = b.get("works") or []
+    work_key = works[0]["key"] if works and isinstance(works[0], dict) and "key" in works[0] else None
+    return pages, subjects, description, work_key
+
+def _ol_merge_work(wk: dict, description: Optional[str], subjects: List[str]):
+    if not description:
+        d = wk.get("description")
+        description = (d.get("value") if isinstance(d, dict) else d) if d else None
+    if not subjects:
+        subs = wk.get("subjects") or []
+        subjects = [s for s in subs if isinstance(s, str)]
+    return description, subjects
+
+def _ol_fields(pages, subjects: List[str], description: Optional[str]) -> Fields:
     pc = pages if isinstance(pages,int) and pages>0 else None
-    return pc, genres, description
+    return pc, normalize_genres(subjects), description
 
-def from_google_books(isbn: str) -> Tuple[Optional[int], List[str], Optional[str]]:
-    base = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-    if GOOGLE_API_KEY: base += f"&key={GOOGLE_API_KEY}"
-    j = http_json(base)
+def _gb_fields(j: dict) -> Fields:
     items = j.get("items") or []
     if not items: return None, [], None
     v = items[0].get("volumeInfo", {})
@@ -424,45 +523,258 @@ def from_google_books(isbn: str) -> Tuple[Optional[int], List[str], Optional[str
             normalize_genres(cats),
             (desc or None))
 
-# ---------------- DB helpers ----------------
-def connect():
-    conn = psycopg2.connect(**PG)
-    conn.autocommit = False
-    return conn
+def from_openlibrary(isbn: str) -> Fields:
+    pages, subjects, description, work_key = _ol_edition_fields(http_json(ol_edition_url(isbn)))
+    if (not description or not subjects) and work_key:
+        description, subjects = _ol_merge_work(http_json(ol_work_url(work_key)), description, subjects)
+    return _ol_fields(pages, subjects, description)
+
+def from_google_books(isbn: str) -> Fields:
+    return _gb_fields(http_json(gb_url(f"isbn:{isbn}")))
+
+# ---- batched variants: one request per chunk, fanned back out per ISBN ----
+# Results are stored in the cache under the single-ISBN URLs, so cache hits,
+# --offline and the per-ISBN adapters above all see the same entries.
+def _chunks(xs: List[str], n: int) -> Iterator[List[str]]:
+    n = max(1, n)
+    for i in range(0, len(xs), n):
+        yield xs[i:i + n]
+
+def ol_editions_batch(isbns: List[str]) -> Dict[str, dict]:
+    """
+    Edition records via api/books?bibkeys=ISBN:a,ISBN:b&jscmd=details (OL_BATCH per call).
+    Only ISBNs OpenLibrary actually answered for are in the result ({} = no such edition).
+    """
+    out: Dict[str, dict] = {}
+    todo = []
+    for i in isbns:
+        hit = cache_lookup(ol_edition_url(i))
+        if hit is not None: out[i] = hit
+        else: todo.append(i)
+    if OFFLINE:
+        return out
+    for chunk in _chunks(todo, OL_BATCH):
+        keys = ",".join(f"ISBN:{i}" for i in chunk)
+        status, j = _fetch_json(f"{OL_BASE_URL}/api/books?bibkeys={keys}&jscmd=details&format=json")
+        if status != 200:
+            continue  # no answer for this chunk: absent from `out`, not a miss
+        for i in chunk:
+            rec = (j.get(f"ISBN:{i}") or {}).get("details") or {}
+            out[i] = rec  # absent from a good answer == 404 for that ISBN
+            remember(ol_edition_url(i), 200 if rec else 404, rec)
+    return out
+
+def gb_lookup_batch(isbns: List[str]) -> Dict[str, dict]:
+    """
+    Google volumes responses per ISBN. Chunks of GB_BATCH go out as one
+    "isbn:a OR isbn:b" query and items are matched back via industryIdentifiers;
+    ISBNs the combined query did not return get a single-ISBN confirmation
+    lookup, so a miss costs no more than before.
+    """
+    out: Dict[str, dict] = {}
+    todo = []
+    for i in isbns:
+        hit = cache_lookup(gb_url(f"isbn:{i}"))
+        if hit is not None: out[i] = hit
+        else: todo.append(i)
+    if OFFLINE:
+        return out
+    for chunk in _chunks(todo, GB_BATCH):
+        rest = chunk
+        if len(chunk) > 1:
+            wanted = set(chunk)
+            _, j = _fetch_json(gb_url("+OR+".join(f"isbn:{i}" for i in chunk), maxResults=40))
+            for item in j.get("items") or []:
+                for ident in (item.get("volumeInfo") or {}).get("industryIdentifiers") or []:
+                    i13 = isbn13(ident.get("identifier") or "")
+                    if i13 in wanted and i13 not in out:
+                        out[i13] = {"totalItems": 1, "items": [item]}
+                        remember(gb_url(f"isbn:{i13}"), 200, out[i13])
+            rest = [i for i in chunk if i not in out]
+        for i in rest:
+            out[i] = http_json(gb_url(f"isbn:{i}"))
+    return out
+
+# ---- change detection ----
+# Per ISBN, enrichment_src->'seen' holds one entry per source payload we
+# used: {"hash", "at", "etag", "lm", "work"}. The hash covers the values we
+# extract, not the raw bytes, so batch and single-ISBN endpoints agree and
+# upstream noise (revision counters, timestamps) does not count as a change.
+SOURCE_OF = {"openlibrary": "openlibrary", "openlibrary_work": "openlibrary", "google": "google"}
 
+def source_values(source: str, payload: dict) -> Dict[str, Tuple[object, str]]:
+    """payload of a "seen" source -> field -> (value, via)"""
+    if source == "openlibrary":
+        pages, subjects, description, _ = _ol_edition_fields(payload)
+        pc, genres, description = _ol_fields(pages, subjects, description)
+        return {"page_count": (pc, "number_of_pages" if payload.get("number_of_pages") else "pagination"),
+                "genres": (genres, "edition"), "description": (description, "edition")}
+    if source == "openlibrary_work":
+        description, subjects = _ol_merge_work(payload, None, [])
+        _, genres, description = _ol_fields(None, subjects, description)
+        return {"genres": (genres, "work"), "description": (description, "work")}
+    pc, genres, description = _gb_fields(payload)
+    return {"page_count": (pc, "volumes"), "genres": (genres, "volumes"), "description": (description, "volumes")}
+
+def seen_entry(values: Dict[str, Tuple[object, str]], etag: Optional[str] = None,
+               last_modified: Optional[str] = None, **extra) -> dict:
+    digest = hashlib.sha1(json.dumps({f: v for f, (v, _) in values.items()}, sort_keys=True,
+                                     separators=(",", ":")).encode("utf-8")).hexdigest()[:16]
+    out = {"hash": digest, "at": int(time.time()), **extra}
+    if etag: out["etag"] = etag
+    if last_modified: out["lm"] = last_modified
+    return out
+
+def seen_url(source: str, i13: str, entry: dict) -> str:
+    if source == "openlibrary":
+        return ol_edition_url(i13)
+    if source == "openlibrary_work":
+        return ol_work_url(entry["work"])
+    return gb_url(f"isbn:{i13}")
+
+# ---------------- DB helpers ----------------
 def ensure_schema(cur):
     cur.execute("""
         ALTER TABLE books
           ADD COLUMN IF NOT EXISTS enriched_at     timestamptz,
           ADD COLUMN IF NOT EXISTS last_attempt_at timestamptz,
-          ADD COLUMN IF NOT EXISTS attempt_count   int DEFAULT 0;
+          ADD COLUMN IF NOT EXISTS attempt_count   int DEFAULT 0,
+          ADD COLUMN IF NOT EXISTS lease_owner     text,
+          ADD COLUMN IF NOT EXISTS lease_until     timestamptz,
+          ADD COLUMN IF NOT EXISTS enrichment_src  jsonb;
     """)
     cur.execute("CREATE INDEX IF NOT EXISTS idx_books_isbn13 ON books(isbn13);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_books_last_attempt ON books(last_attempt_at);")
+    # "needs enrichment" work queue: Postgres keeps the flag and the sort key
+    # current on every write, the partial index holds only queued rows
+    cur.execute("""
+        ALTER TABLE books
+          ADD COLUMN IF NOT EXISTS needs_enrichment boolean GENERATED ALWAYS AS (
+                (page_count IS NULL OR page_count <= 0)
+             OR (genres IS NULL OR array_length(genres,1) IS NULL)
+             OR (description IS NULL OR length(description) < 10)
+          ) STORED,
+          ADD COLUMN IF NOT EXISTS attempt_order timestamptz GENERATED ALWAYS AS (
+                COALESCE(last_attempt_at, '-infinity'::timestamptz)
+          ) STORED;
+    """)
+    # rows whose isbn13 cannot be an ISBN (ISBN_OK_SQL, same test as isbn13())
+    # stay out of the index: no lookup could ever fill them
+    cur.execute("DROP INDEX IF EXISTS idx_books_needs_enrichment;")  # superseded by idx_books_enrich_queue
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_books_enrich_queue
+          ON books (attempt_order, id) INCLUDE (isbn13)
+          WHERE needs_enrichment AND {ISBN_OK_SQL};
+    """)
+
+# keyset cursor over the queue: (attempt_order, id) of the last row handed out.
+# attempt_order travels as text: psycopg2 cannot round-trip '-infinity'.
+QueueCursor = Tuple[str, int]
+QUEUE_START: QueueCursor = ("-infinity", 0)
 
-def fetch_isbns_to_enrich(cur, limit: int) -> List[str]:
-    # Only pick rows still missing something AND not attempted in the cool-down window
-    sql = f"""
-      SELECT isbn13
-      FROM books
-      WHERE (
-              (page_count IS NULL OR page_count <= 0)
-           OR (genres IS NULL OR array_length(genres,1) IS NULL)
-           OR (description IS NULL OR length(description) < 10)
-            )
-        AND (last_attempt_at IS NULL OR last_attempt_at < NOW() - INTERVAL '{ATTEMPT_COOLDOWN_MIN} minutes')
-      ORDER BY last_attempt_at NULLS FIRST, id
-      LIMIT %s
+# the WHERE repeats idx_books_enrich_queue's predicate word for word, so the
+# planner matches the partial index and re-checks nothing per row.
+CANDIDATE_SQL = f"""
+  SELECT attempt_order::text, id, isbn13
+  FROM books
+  WHERE needs_enrichment
+    AND {ISBN_OK_SQL}
+    AND attempt_order < NOW() - make_interval(mins => %s)
+    AND (attempt_order, id) > (%s::timestamptz, %s)
+  ORDER BY books.attempt_order, books.id  -- the columns, not the ::text output
+  LIMIT %s
+"""
+
+def fetch_isbns_to_enrich(cur, limit: int,
+                          after: QueueCursor = QUEUE_START) -> Tuple[List[str], Optional[QueueCursor]]:
+    """
+    Next page of the queue, oldest attempt first, skipping rows attempted in
+    the cool-down window. Index-only range read on idx_books_enrich_queue.
+    Returns (isbns, cursor for the next call); cursor is None when the queue is drained.
+    """
+    cur.execute(CANDIDATE_SQL, (ATTEMPT_COOLDOWN_MIN, after[0], after[1], limit))
+    rows = cur.fetchall()
+    if not rows:
+        return [], None
+    return [r[2] for r in rows if r[2]], (rows[-1][0], rows[-1][1])
+
+CLAIM_SQL = f"""
+  WITH picked AS (
+    SELECT id
+    FROM books
+    WHERE needs_enrichment
+      AND {ISBN_OK_SQL}
+      AND attempt_order < NOW() - make_interval(mins => %s)
+      AND (attempt_order, id) > (%s::timestamptz, %s)
+      AND (lease_until IS NULL OR lease_until < NOW())
+    ORDER BY attempt_order, id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+  ), claimed AS (
+    UPDATE books b
+    SET lease_owner = %s,
+        lease_until = NOW() + make_interval(mins => %s)
+    FROM picked
+    WHERE b.id = picked.id
+    RETURNING b.attempt_order, b.id, b.isbn13
+  )
+  SELECT attempt_order::text, id, isbn13 FROM claimed ORDER BY claimed.attempt_order, claimed.id
+"""
+
+def claim_isbns_to_enrich(cur, limit: int, owner: str,
+                          after: QueueCursor = QUEUE_START) -> Tuple[List[str], Optional[QueueCursor]]:
     """
-    cur.execute(sql, (limit,))
-    return [r[0] for r in cur.fetchall() if r[0]]
+    Worker-mode variant of fetch_isbns_to_enrich: lease the next page to `owner`.
+    Rows locked or leased by other workers are skipped (SKIP LOCKED), expired
+    leases of crashed workers are picked up again. Commit right after claiming
+    so other workers see the lease; writing the enrichment clears it.
+    """
+    cur.execute(CLAIM_SQL, (ATTEMPT_COOLDOWN_MIN, after[0], after[1], limit, owner, LEASE_MIN))
+    rows = cur.fetchall()
+    if not rows:
+        return [], None
+    return [r[2] for r in rows if r[2]], (rows[-1][0], rows[-1][1])
+
+# per-row plan: which fields a queued row still lacks (same tests as
+# needs_enrichment) and which of them each source already failed to provide
+# for that ISBN (enrichment_src->'failed', e.g. {"google": ["page_count"]})
+FIELDS = ("page_count", "genres", "description")
+Todo = Tuple[FrozenSet[str], Dict[str, List[str]]]  # (missing fields, source -> failed fields)
+ALL_MISSING: Todo = (frozenset(FIELDS), {})
+
+TODO_SQL = """
+  SELECT isbn13,
+         (page_count IS NULL OR page_count <= 0),
+         (genres IS NULL OR array_length(genres,1) IS NULL),
+         (description IS NULL OR length(description) < 10),
+         COALESCE(enrichment_src->'failed', '{}'::jsonb)
+  FROM books
+  WHERE isbn13 = ANY(%s)
+"""
+
+def load_todo(cur, isbns: List[str]) -> Dict[str, Todo]:
+    """isbn13 (as stored) -> Todo for a page of candidates."""
+    if not isbns:
+        return {}
+    cur.execute(TODO_SQL, (isbns,))
+    return {raw: (frozenset(f for f, m in zip(FIELDS, flags) if m), failed or {})
+            for raw, *flags, failed in cur.fetchall()}
+
+# update row: (page_count, genres[], description, isbn13, provenance)
+# provenance: field -> {"src", "conf", "via"} for the fields being set, plus
+# "failed" when it changed; merged into enrichment_src
+Update = Tuple[Optional[int], List[str], Optional[str], str, dict]
+
+def _provenance_cols(prov: dict) -> tuple:
+    """-> (page_count_source, page_count_confidence, genre_source, genre_confidence, enrichment_src patch)"""
+    pc, g = prov.get("page_count") or {}, prov.get("genres") or {}
+    return pc.get("src"), pc.get("conf"), g.get("src"), g.get("conf"), json.dumps(prov, separators=(",", ":"))
 
-def upsert_enrichment(cur,
-                      rows: List[Tuple[Optional[int], List[str], Optional[str], str]]
-                      ):
+def upsert_enrichment(cur, rows: List[Update]):
     """
-    rows: (page_count, genres[], description, isbn13)
-    - apply typed updates
+    rows: (page_count, genres[], description, isbn13, provenance)
+    - apply typed updates, with source/confidence for the fields set
+    - merge provenance into enrichment_src
     - bump enriched_at only if we set any of the fields
     - always bump last_attempt_at and attempt_count
     """
@@ -472,93 +784,683 @@ def upsert_enrichment(cur,
         page_count  = COALESCE(%s::int, page_count),
         genres      = COALESCE(NULLIF(%s::text[], '{}'), genres),
         description = COALESCE(%s::text, description),
+        page_count_source     = COALESCE(%s::text, page_count_source),
+        page_count_confidence = COALESCE(%s::real, page_count_confidence),
+        genre_source          = COALESCE(%s::text, genre_source),
+        genre_confidence      = COALESCE(%s::real, genre_confidence),
+        enrichment_src        = COALESCE(enrichment_src, '{}'::jsonb) || %s::jsonb   -- "seen" merged per source
+                                || jsonb_build_object('seen', COALESCE(enrichment_src->'seen', '{}'::jsonb)
+                                                              || COALESCE(%s::jsonb->'seen', '{}'::jsonb)),
         enriched_at = CASE
                         WHEN %s::int    IS NOT NULL
-                          OR %s::text[] IS NOT NULL
+                          OR NULLIF(%s::text[], '{}') IS NOT NULL
                           OR %s::text   IS NOT NULL
                         THEN NOW()
                         ELSE enriched_at
                       END,
         last_attempt_at = NOW(),
-        attempt_count   = COALESCE(attempt_count,0) + 1
+        attempt_count   = COALESCE(attempt_count,0) + 1,
+        lease_owner     = NULL,
+        lease_until     = NULL
       WHERE isbn13 = %s
     """
-    psycopg2.extras.execute_batch(cur, sql, rows, page_size=200)
+    args = [(p, g, d, *cols, cols[-1], p, g, d, i13)
+            for p, g, d, i13, prov in rows for cols in (_provenance_cols(prov),)]
+    psycopg2.extras.execute_batch(cur, sql, args, page_size=200)
 
-# ---------------- main ----------------
-def main():
-    conn = connect()
-    cur  = conn.cursor()
-    ensure_schema(cur)
+def _pg_text_array(vals: List[str]) -> str:
+    return "{" + ",".join('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in vals) + "}"
+
+def upsert_enrichment_copy(cur, rows: List[Update]):
+    """
+    Bulk variant of upsert_enrichment (same rows, same resulting values):
+    COPY the batch into a temp table, then one set-based UPDATE ... FROM.
+    """
+    # execute_batch applies rows in order -> last row for an isbn wins; keep that
+    latest = {i13: (p, g, d, prov) for p, g, d, i13, prov in rows}
+
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    for i13, (p, g, d, prov) in latest.items():
+        # CSV COPY: unquoted empty field = NULL, so only non-NULL values are written
+        w.writerow([i13, "" if p is None else p, _pg_text_array(g or []), d if d is not None else "",
+                    *("" if v is None else v for v in _provenance_cols(prov))])
+    buf.seek(0)
+
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS tmp_enrichment (
+          isbn13      text,
+          page_count  int,
+          genres      text[],
+          description text,
+          pc_src      text,
+          pc_conf     real,
+          g_src       text,
+          g_conf      real,
+          src_patch   jsonb
+        )
+    """)
+    cur.execute("TRUNCATE tmp_enrichment")
+    cur.copy_expert("COPY tmp_enrichment (isbn13, page_count, genres, description, "
+                    "pc_src, pc_conf, g_src, g_conf, src_patch) FROM STDIN WITH (FORMAT csv)", buf)
+    cur.execute("""
+      UPDATE books b
+      SET
+        page_count  = COALESCE(t.page_count, b.page_count),
+        genres      = COALESCE(NULLIF(t.genres, '{}'), b.genres),
+        description = COALESCE(t.description, b.description),
+        page_count_source     = COALESCE(t.pc_src, b.page_count_source),
+        page_count_confidence = COALESCE(t.pc_conf, b.page_count_confidence),
+        genre_source          = COALESCE(t.g_src, b.genre_source),
+        genre_confidence      = COALESCE(t.g_conf, b.genre_confidence),
+        enrichment_src        = COALESCE(b.enrichment_src, '{}'::jsonb) || t.src_patch   -- "seen" merged per source
+                                || jsonb_build_object('seen', COALESCE(b.enrichment_src->'seen', '{}'::jsonb)
+                                                              || COALESCE(t.src_patch->'seen', '{}'::jsonb)),
+        enriched_at = CASE
+                        WHEN t.page_count  IS NOT NULL
+                          OR NULLIF(t.genres, '{}') IS NOT NULL
+                          OR t.description IS NOT NULL
+                        THEN NOW()
+                        ELSE b.enriched_at
+                      END,
+        last_attempt_at = NOW(),
+        attempt_count   = COALESCE(b.attempt_count,0) + 1,
+        lease_owner     = NULL,
+        lease_until     = NULL
+      FROM tmp_enrichment t
+      WHERE b.isbn13 = t.isbn13
+    """)
+    return cur.rowcount
+
+def write_enrichment(cur, rows: List[Update]):
+    if WRITE_MODE == "copy":
+        upsert_enrichment_copy(cur, rows)
+    else:
+        upsert_enrichment(cur, rows)
+
+# ---------------- fetch engine ----------------
+# Field-level planning: a source is only asked for ISBNs that still miss a
+# field it has not already failed to provide, and only fields that are
+# missing get written. Confidence is a per source/field prior (or per "via"
+# where one source has sources of different quality).
+CONFIDENCE = {
+    ("openlibrary", "page_count"):  0.9,   # number_of_pages
+    ("openlibrary", "pagination"):  0.6,   # first number of e.g. "xii, 320 p."
+    ("openlibrary", "genres"):      0.6,   # free-text subjects through GENRE_MAP
+    ("openlibrary", "description"): 0.8,
+    ("google", "page_count"):       0.8,
+    ("google", "genres"):           0.8,   # BISAC-style categories
+    ("google", "description"):      0.7,
+}
+OL_WORK_FIELDS = frozenset({"genres", "description"})
+
+Found = Dict[str, Tuple[object, dict]]  # field -> (value, provenance)
+
+def _wants(todo: Todo, source: str) -> FrozenSet[str]:
+    missing, failed = todo
+    return missing - set(failed.get(source) or ())
+
+def _take(found: Found, field: str, value, source: str, via: str) -> bool:
+    """Record `value` for a still-empty field (first source wins)."""
+    if field in found or not value or (field == "description" and len(value) < 10):
+        return False
+    conf = CONFIDENCE.get((source, via), CONFIDENCE[(source, field)])
+    found[field] = (value, {"src": source, "conf": conf, "via": via})
+    return True
+
+def _count_source(source: str, hit: bool):
+    METRICS.inc("source_lookups", source=source)
+    if hit: METRICS.inc("source_hits", source=source)
+
+def _plan(plan: Dict[str, Todo], source: str, found: Dict[str, Found]) -> Dict[str, FrozenSet[str]]:
+    """ISBNs worth a `source` lookup -> fields to take from it."""
+    out = {}
+    for i, todo in plan.items():
+        want = _wants(todo, source) - set(found[i])
+        if want: out[i] = want
+        else: METRICS.inc("lookups_skipped", source=source)
+    return out
+
+def enrich_one(isbn: str, todo: Todo = ALL_MISSING) -> Optional[Update]:
+    """All HTTP for one ISBN -> update row for upsert_enrichment (None = unusable ISBN)."""
+    rows = enrich_many([(isbn, todo)])
+    return rows[0] if rows else None
+
+def enrich_many(items: List[Tuple[str, Todo]]) -> List[Update]:
+    """
+    (isbn, Todo) chunk -> update rows, a handful of batched requests instead
+    of 2-3 per ISBN: OpenLibrary editions for ISBNs it can still help with,
+    the OL work only when the edition left genres/description open, Google
+    only for what is left after that.
+    """
+    plan: Dict[str, Todo] = {}
+    for isbn, todo in items:
+        i13 = isbn13(isbn)
+        if i13: plan[i13] = todo
+        else: METRICS.inc("books", outcome="skipped")
+    found: Dict[str, Found] = {i: {} for i in plan}
+    answered: Dict[str, Dict[str, Set[str]]] = {i: {} for i in plan}  # source -> fields it gave a definite answer on
+    seen: Dict[str, Dict[str, dict]] = {i: {} for i in plan}           # source -> seen_entry, for --refresh
+
+    ol_want = _plan(plan, "openlibrary", found)
+    editions = ol_editions_batch(list(ol_want))
+    works: Dict[str, dict] = {}  # editions of one work share the fetch
+    for i, want in ol_want.items():
+        rec = editions.get(i)
+        if rec is None:
+            continue  # no answer (offline cache miss, upstream error): not a failure
+        pages, subjects, description, work_key = _ol_edition_fields(rec)
+        via = {"genres": "edition" if subjects else "work",
+               "description": "edition" if description else "work"}
+        definite = set(want)
+        if want & OL_WORK_FIELDS and (not description or not subjects) and work_key:
+            if work_key not in works:
+                works[work_key] = http_json(ol_work_url(work_key))
+            if not works[work_key]:
+                definite -= {f for f in OL_WORK_FIELDS if via[f] == "work"}
+            else:
+                seen[i]["openlibrary_work"] = seen_entry(source_values("openlibrary_work", works[work_key]),
+                                                         work=work_key)
+            description, subjects = _ol_merge_work(works[work_key], description, subjects)
+        pc, genres, description = _ol_fields(pages, subjects, description)
+        got = found[i]
+        hit = False
+        if "page_count" in want:
+            hit |= _take(got, "page_count", pc, "openlibrary",
+                         "number_of_pages" if rec.get("number_of_pages") else "pagination")
+        if "genres" in want:
+            hit |= _take(got, "genres", genres, "openlibrary", via["genres"])
+        if "description" in want:
+            hit |= _take(got, "description", description, "openlibrary", via["description"])
+        _count_source("openlibrary", hit)
+        answered[i]["openlibrary"] = definite
+        seen[i]["openlibrary"] = seen_entry(source_values("openlibrary", rec))
+
+    gb_want = _plan(plan, "google", found)
+    gb_raw = gb_lookup_batch(list(gb_want))
+    for i, want in gb_want.items():
+        j = gb_raw.get(i) or {}
+        if "totalItems" not in j and "items" not in j:
+            continue  # offline / non-200: no answer
+        pc, genres, description = _gb_fields(j)
+        got = found[i]
+        hit = False
+        for field, value in zip(FIELDS, (pc, genres, description)):
+            if field in want:
+                hit |= _take(got, field, value, "google", "volumes")
+        _count_source("google", hit)
+        answered[i]["google"] = set(want)
+        seen[i]["google"] = seen_entry(source_values("google", j))
+
+    out = []
+    for i in plan:
+        if OFFLINE and not answered[i]:
+            METRICS.inc("books", outcome="cache_miss")  # nothing cached: no attempt, retry budget kept
+            continue
+        out.append(combine(i, found[i], _failed(plan[i][1], answered[i], found[i]), seen[i]))
+    return out
+
+def _failed(before: Dict[str, List[str]], answered: Dict[str, Set[str]],
+            found: Found) -> Optional[Dict[str, List[str]]]:
+    """Merged source -> failed fields, or None when nothing new failed."""
+    out = {s: list(fs) for s, fs in before.items()}
+    changed = False
+    for source, fields in answered.items():
+        new = {f for f in fields if found.get(f, (None, {}))[1].get("src") != source}
+        new -= set(out.get(source) or ())
+        if new:
+            out[source] = sorted(set(out.get(source) or ()) | new)
+            changed = True
+    return out if changed else None
+
+def combine(i13: str, found: Found, failed: Optional[Dict[str, List[str]]] = None,
+            seen: Optional[Dict[str, dict]] = None) -> Update:
+    """Planned fields -> update row for upsert_enrichment (values + provenance)."""
+    prov: dict = {f: src for f, (_, src) in found.items()}
+    if failed is not None:
+        prov["failed"] = failed
+    if seen:
+        prov["seen"] = seen
+    p = found["page_count"][0] if "page_count" in found else None
+    g = found["genres"][0] if "genres" in found else []   # empty list => no change via NULLIF('{}')
+    d = found["description"][0] if "description" in found else None
+    # even if no new data, we still mark the attempt to avoid tight retry loops
+    METRICS.inc("books", outcome="changed" if found else "unchanged")
+    return (p, g, d, i13, prov)
+
+# ---------------- refresh (conditional re-fetch) ----------------
+# --refresh sweeps every book with "seen" sources: one conditional GET per
+# source (If-None-Match / If-Modified-Since). 304s and payloads whose content
+# hash is unchanged are not parsed further / not written; changed sources
+# overwrite only the fields they provided. Values that disappeared upstream
+# are kept.
+REFRESH_SQL = """
+  SELECT id, isbn13, enrichment_src
+  FROM books
+  WHERE id > %s AND isbn13 IS NOT NULL AND enrichment_src ? 'seen'
+  ORDER BY id
+  LIMIT %s
+"""
+
+def _owned(prov: Optional[dict], source: str) -> bool:
+    """Was this field filled from `source` (edition vs work told apart by via)?"""
+    return bool(prov) and prov.get("src") == SOURCE_OF[source] \
+        and (prov.get("via") == "work") == (source == "openlibrary_work")
+
+def refresh_one(i13: str, src: dict) -> Optional[Update]:
+    """Conditional re-fetch of the sources seen for one ISBN -> update row, None = nothing to write."""
+    cutoff = time.time() - REFRESH_MIN_AGE_DAYS * 86400
+    seen: Dict[str, dict] = {}
+    found: Found = {}
+    for source, entry in (src.get("seen") or {}).items():
+        if source not in SOURCE_OF or entry.get("at", 0) > cutoff:
+            continue
+        url = seen_url(source, i13, entry)
+        status, data, etag, lm = fetch_conditional(url, entry.get("etag"), entry.get("lm"))
+        if status == 304:
+            METRICS.inc("refresh", source=source, result="not_modified")
+            continue
+        if status not in (200, 404):
+            METRICS.inc("refresh", source=source, result="error")
+            continue
+        remember(url, status, data)
+        values = source_values(source, data)
+        new = seen_entry(values, etag, lm, **({"work": entry["work"]} if "work" in entry else {}))
+        if new["hash"] == entry.get("hash"):
+            METRICS.inc("refresh", source=source, result="unchanged")
+            if (new.get("etag"), new.get("lm")) != (entry.get("etag"), entry.get("lm")):
+                seen[source] = new  # store the validators: the next sweep gets a 304
+            continue
+        METRICS.inc("refresh", source=source, result="changed")
+        seen[source] = new
+        for field, (value, via) in values.items():
+            if _owned(src.get(field), source):
+                _take(found, field, value, SOURCE_OF[source], via)
+    if not seen:
+        return None
+    return combine(i13, found, seen=seen)
+
+def refresh_many(items: List[Tuple[str, dict]]) -> List[Update]:
+    return [row for raw, src in items for i13 in (isbn13(raw),) if i13
+            for row in (refresh_one(i13, src or {}),) if row is not None]
+
+SEEN_SQL = """
+  UPDATE books
+  SET enrichment_src = COALESCE(enrichment_src, '{}'::jsonb)
+                       || jsonb_build_object('seen', COALESCE(enrichment_src->'seen', '{}'::jsonb) || %s::jsonb)
+  WHERE isbn13 = %s
+"""
+
+def write_refresh(cur, rows: List[Update]):
+    """Rows with new values go through write_enrichment; validator-only rows just merge "seen"."""
+    changed, touched = [], []
+    for row in rows:
+        if row[0] is not None or row[1] or row[2] is not None:
+            changed.append(row)
+        else:
+            touched.append((json.dumps(row[4].get("seen") or {}, separators=(",", ":")), row[3]))
+    if changed:
+        write_enrichment(cur, changed)
+    if touched:
+        psycopg2.extras.execute_batch(cur, SEEN_SQL, touched, page_size=200)
+
+# ---------------- re-derive (offline) ----------------
+# --rederive walks every book and recomputes genres from the cached source
+# payloads with the current GENRE_MAP, in enrich_many's source order. Found
+# genres overwrite the stored ones (with provenance); books without cached
+# payloads are left alone, and no attempt is recorded. enriched_at is bumped
+# so embed_books and GenreIndex.refresh() pick the new genres up.
+REDERIVE_SQL = """
+  SELECT id, isbn13, genres
+  FROM books
+  WHERE id > %s AND isbn13 IS NOT NULL
+  ORDER BY id
+  LIMIT %s
+"""
+
+GENRES_SQL = """
+  UPDATE books
+  SET genres = %s::text[], genre_source = %s, genre_confidence = %s,
+      enrichment_src = COALESCE(enrichment_src, '{}'::jsonb) || jsonb_build_object('genres', %s::jsonb),
+      enriched_at = NOW()
+  WHERE isbn13 = %s
+"""
+
+def rederive_one(i13: str, current: Optional[List[str]]) -> Optional[Update]:
+    """Genres from cached payloads -> update row, None = nothing cached or unchanged."""
+    found: Found = {}
+    rec = cache_lookup(ol_edition_url(i13))
+    if rec:
+        _, subjects, _, work_key = _ol_edition_fields(rec)
+        if subjects:
+            _take(found, "genres", normalize_genres(subjects), "openlibrary", "edition")
+        elif work_key:
+            wk = cache_lookup(ol_work_url(work_key))
+            if wk:
+                _take(found, "genres", normalize_genres(_ol_merge_work(wk, None, [])[1]), "openlibrary", "work")
+    if "genres" not in found:
+        j = cache_lookup(gb_url(f"isbn:{i13}"))
+        if j:
+            _take(found, "genres", _gb_fields(j)[1], "google", "volumes")
+    if "genres" not in found or found["genres"][0] == list(current or []):
+        METRICS.inc("rederive", result="unchanged" if "genres" in found else "not_cached")
+        return None
+    METRICS.inc("rederive", result="changed")
+    genres, prov = found["genres"]
+    return None, genres, None, i13, {"genres": prov}
+
+def rederive_many(items: List[Tuple[str, Optional[List[str]]]]) -> List[Update]:
+    return [row for raw, current in items for i13 in (isbn13(raw),) if i13
+            for row in (rederive_one(i13, current),) if row is not None]
+
+def write_rederive(cur, rows: List[Update]):
+    """Overwrites genres and their provenance, bumps enriched_at; attempt bookkeeping is untouched."""
+    args = [(g, prov["genres"]["src"], prov["genres"]["conf"],
+             json.dumps(prov["genres"], separators=(",", ":")), i13) for _, g, _, i13, prov in rows]
+    psycopg2.extras.execute_batch(cur, GENRES_SQL, args, page_size=200)
+
+# ---------------- bulk dump ingestion ----------------
+def load_queue_isbns(conn) -> Dict[str, FrozenSet[str]]:
+    """Every ISBN still in the work queue -> its missing fields (server-side cursor, streamed)."""
+    rows = stream(conn, """
+        SELECT isbn13,
+               (page_count IS NULL OR page_count <= 0),
+               (genres IS NULL OR array_length(genres,1) IS NULL),
+               (description IS NULL OR length(description) < 10)
+        FROM books WHERE needs_enrichment AND isbn13 IS NOT NULL
+    """, itersize=20000, name="queue_isbns")
+    out = {i13: frozenset(f for f, m in zip(FIELDS, flags) if m)
+           for raw, *flags in rows for i13 in (isbn13(raw),) if i13}
     conn.commit()
+    return out
 
-    processed = 0
-    target = MAX_BOOKS if MAX_BOOKS > 0 else None
+def ingest_dump(conn, editions_path: str, works_path: Optional[str] = None) -> int:
+    """
+    Enrich from local OpenLibrary dumps instead of the API: one streaming pass
+    over editions (joined against the queue), then one over works for the
+    editions that lack a description/subjects. Same extraction as
+    from_openlibrary, only missing fields are written (COPY path). Returns rows written.
+    """
+    wanted = load_queue_isbns(conn)
+    print(f"Queue: {len(wanted)} ISBNs; scanning {editions_path}")
+    cur = conn.cursor()
+    rows: List[Update] = []
+    written = 0
+
+    def add(i13: str, missing: FrozenSet[str], fields: Fields):
+        nonlocal rows, written
+        found: Found = {}
+        for field, value in zip(FIELDS, fields):
+            if field in missing:
+                _take(found, field, value, "openlibrary", "dump")
+        rows.append(combine(i13, found))
+        if len(rows) >= max(1, FLUSH_ROWS) * 10:
+            written += upsert_enrichment_copy(cur, rows)
+            conn.commit()
+            rows = []
 
+    pending: Dict[str, tuple] = {}        # i13 -> (missing, pages, subjects, description) waiting for its work
+    by_work: Dict[str, List[str]] = {}    # work key -> ISBNs
     try:
-        while True:
-            need = BATCH_SIZE if target is None else max(0, min(BATCH_SIZE, target - processed))
-            if need == 0: break
-
-            isbns = fetch_isbns_to_enrich(cur, need)
-            if not isbns:
-                print("No more eligible candidates right now.")
-                break
-
-            updates: List[Tuple[Optional[int], List[str], Optional[str], str]] = []
-
-            for isbn in tqdm(isbns, desc="Enriching"):
-                i13 = isbn13(isbn)
-                if not i13:
-                    continue
-
-                ol_pc, ol_genres, ol_desc = from_openlibrary(i13)
-
-                gb_pc, gb_genres, gb_desc = (None, [], None)
-                if not ol_pc or not ol_genres or not ol_desc:
-                    gb_pc, gb_genres, gb_desc = from_google_books(i13)
-
-                page_count  = pick_best_int(ol_pc, gb_pc)
-                genres      = ol_genres if ol_genres else gb_genres
-                description = ol_desc if (ol_desc and len(ol_desc) >= 10) else gb_desc
-
-                # Only queue if we learned anything
-                if page_count or genres or (description and len(description) >= 10):
-                    p = page_count if page_count else None
-                    g = genres if genres else []   # empty list => no change via NULLIF('{}')
-                    d = description if description else None
-                    updates.append((p, g, d, p, g, d, i13))
-                else:
-                    # even if no new data, we still mark the attempt to avoid tight retry loops
-                    updates.append((None, [], None, None, [], None, i13))
-
-                if SLEEP_MS > 0:
-                    time.sleep(SLEEP_MS / 1000.0)
-
-            if updates:
-                upsert_enrichment(cur, updates)
-                conn.commit()
-
-                cur.execute("""
-                    SELECT
-                      COUNT(*) FILTER (WHERE enriched_at   > NOW() - INTERVAL '5 minutes') AS changed_rows,
-                      COUNT(*) FILTER (WHERE last_attempt_at > NOW() - INTERVAL '5 minutes') AS attempted_rows
-                    FROM books
-                """)
-                changed, attempted = cur.fetchone()
-                print(f"Committed {len(updates)} updates; changed in 5 min: {changed}, attempted in 5 min: {attempted}")
+        for i13, rec in scan_editions(editions_path, wanted.keys(), isbn13):
+            missing = wanted.pop(i13, None)  # first edition carrying the ISBN wins
+            if not missing:
+                continue
+            pages, subjects, description, work_key = _ol_edition_fields(rec)
+            if (not description or not subjects) and missing & OL_WORK_FIELDS and work_key and works_path:
+                pending[i13] = (missing, pages, subjects, description)
+                by_work.setdefault(work_key, []).append(i13)
             else:
-                print("Batch produced 0 updates.")
+                add(i13, missing, _ol_fields(pages, subjects, description))
 
-            processed += len(isbns)
-            if target is not None and processed >= target:
-                break
+        if by_work:
+            print(f"Scanning {works_path} for {len(by_work)} works")
+            for key, wk in scan_works(works_path, set(by_work)):
+                for i13 in by_work.pop(key, ()):  # a work listed twice: the first record wins
+                    entry = pending.pop(i13, None)
+                    if entry is None:
+                        continue
+                    missing, pages, subjects, description = entry
+                    description, subjects = _ol_merge_work(wk, description, subjects)
+                    add(i13, missing, _ol_fields(pages, subjects, description))
+        for i13, (missing, pages, subjects, description) in pending.items():  # work not in the dump
+            add(i13, missing, _ol_fields(pages, subjects, description))
 
+        if rows:
+            written += upsert_enrichment_copy(cur, rows)
+            conn.commit()
     finally:
         cur.close()
-        conn.close()
+    return written
+
+# ---------------- journal replay ----------------
+# Journal rows whose book was attempted after the fetch already reached the
+# DB (commit landed, checkpoint did not): replaying them again is skipped.
+UNAPPLIED_SQL = """
+  SELECT j.isbn13
+  FROM unnest(%s::text[], %s::float8[]) AS j(isbn13, fetched)
+  JOIN books b ON b.isbn13 = j.isbn13
+  WHERE b.last_attempt_at IS NULL OR b.last_attempt_at < to_timestamp(j.fetched)
+"""
+
+def replay_journal(pool: Pool, journal: Journal, write) -> int:
+    """Results fetched by a previous run but never committed -> DB, then truncate. Returns rows replayed."""
+    if journal.empty():
+        return 0
+    latest: Dict[str, Tuple[float, Update]] = {}
+    for fetched, rows in journal.read():
+        for row in rows:
+            latest[row[3]] = (fetched, tuple(row))
+
+    def unapplied(conn):
+        with conn.cursor() as cur:
+            cur.execute(UNAPPLIED_SQL, (list(latest), [t for t, _ in latest.values()]))
+            return {r[0] for r in cur.fetchall()}
+
+    todo = pool.run(unapplied) if latest else set()
+    rows = [row for i13, (_, row) in latest.items() if i13 in todo]
+    for batch in chunked(rows, max(1, FLUSH_ROWS)):
+        write(batch)
+    journal.checkpoint()
+    return len(rows)
+
+# ---------------- main ----------------
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Enrich books with page_count / genres / description.")
+    ap.add_argument("--offline", action="store_true",
+                    help="replay from the local HTTP cache only (no network calls)")
+    ap.add_argument("--rederive", action="store_true",
+                    help="recompute genres of every book from the HTTP cache with the current rules (offline)")
+    ap.add_argument("--worker", action="store_true",
+                    help="lease batches (SKIP LOCKED) so several processes/hosts can share the queue")
+    ap.add_argument("--dump-editions", metavar="PATH",
+                    help="enrich from an OpenLibrary editions dump (.txt[.gz]) instead of the API")
+    ap.add_argument("--refresh", action="store_true",
+                    help="conditional re-fetch of already enriched books; writes only what changed upstream")
+    ap.add_argument("--dump-works", metavar="PATH",
+                    help="works dump used with --dump-editions for descriptions/subjects")
+    return ap.parse_args(argv)
+
+def progress_fields() -> dict:
+    processed = METRICS.total("books")
+    out = {"processed": int(processed),
+           "books_per_s": round(processed / max(1e-9, time.time() - METRICS.started), 2),
+           "http_429": int(METRICS.total("http_responses", code=429))}
+    for src in ("openlibrary", "google"):
+        n = METRICS.total("source_lookups", source=src)
+        if n: out[f"hit_rate.{src}"] = round(METRICS.total("source_hits", source=src) / n, 3)
+    out.update({f"rate.{k}": v for k, v in LIMITERS.rates().items()})
+    return out
+
+def chunked(items: Iterable[T], n: int) -> Iterator[List[T]]:
+    buf: List[T] = []
+    for x in items:
+        buf.append(x)
+        if len(buf) >= n:
+            yield buf
+            buf = []
+    if buf: yield buf
+
+STOP = threading.Event()  # first SIGINT/SIGTERM: claim nothing new, drain in-flight work, exit
+
+def _on_signal(signum, frame):
+    if STOP.is_set():
+        raise KeyboardInterrupt  # second signal: leave now, the journal keeps fetched results
+    STOP.set()
+    print(f"\n{signal.Signals(signum).name}: finishing in-flight work (repeat to abort)", file=sys.stderr)
+
+def install_signal_handlers():
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):  # SIGBREAK: Ctrl-Break on Windows
+        sig = getattr(signal, name, None)
+        if sig is not None:
+            signal.signal(sig, _on_signal)
+
+def iter_candidates(pool: Pool, worker: bool, target: Optional[int]):
+    """
+    Stream (isbn, Todo) off the work queue page by page (runs on the producer
+    thread). Each page is its own short transaction on a pooled connection,
+    committed before yielding: leases are published and no transaction stays
+    open while the pipeline back-pressures.
+    """
+    def page(need: int, after: QueueCursor):
+        def read(conn):
+            with conn.cursor() as cur:
+                if worker:
+                    isbns, nxt = claim_isbns_to_enrich(cur, need, WORKER_ID, after)
+                else:
+                    isbns, nxt = fetch_isbns_to_enrich(cur, need, after)
+                todo = load_todo(cur, isbns)
+            return [(i, todo.get(i, ALL_MISSING)) for i in isbns], nxt
+        return pool.run(read)
+
+    pos, produced, rescans = QUEUE_START, 0, 0
+    while True:
+        if STOP.is_set():  # checked between pages: every claimed row still gets processed
+            print("Stopping: no new candidates.")
+            return
+        need = BATCH_SIZE if target is None else max(0, min(BATCH_SIZE, target - produced))
+        if need == 0: return
+
+        items, next_pos = page(need, pos)
+        if worker and next_pos is None and pos != QUEUE_START and rescans < WORKER_RESCANS:
+            # rows behind our cursor may have come free (expired leases): go back
+            # to the head, at most WORKER_RESCANS times per run
+            rescans += 1
+            items, next_pos = page(need, QUEUE_START)
+        pos = next_pos
+        if pos is None:
+            print("No more eligible candidates right now.")
+            return
+
+        produced += len(items)
+        yield from items
+
+def iter_by_id(pool: Pool, sql: str, target: Optional[int]):
+    """
+    Rows of `sql` (id, ...) minus the id, keyset over id, one short
+    transaction per page: REFRESH_SQL -> (isbn, enrichment_src),
+    REDERIVE_SQL -> (isbn, genres).
+    """
+    def page(after: int, need: int):
+        def read(conn):
+            with conn.cursor() as cur:
+                cur.execute(sql, (after, need))
+                return cur.fetchall()
+        return pool.run(read)
+
+    last, produced = 0, 0
+    while not STOP.is_set():
+        need = BATCH_SIZE if target is None else max(0, min(BATCH_SIZE, target - produced))
+        rows = page(last, need) if need else []
+        if not rows:
+            return
+        last = rows[-1][0]
+        produced += len(rows)
+        yield from (tuple(r[1:]) for r in rows)
+
+def main():
+    global OFFLINE
+    args = parse_args()
+    OFFLINE = args.offline or args.rederive
+    if OFFLINE and CACHE is None:
+        raise SystemExit("--offline / --rederive need HTTP_CACHE_PATH to point at a cache file")
+    if OFFLINE and args.refresh:
+        raise SystemExit("--refresh asks upstream what changed; it cannot run --offline / --rederive")
+
+    pool = Pool(maxconn=2)  # candidate producer + writer
+    def schema(conn):
+        with conn.cursor() as cur:
+            ensure_schema(cur)
+    pool.run(schema)
+
+    if args.dump_editions:
+        try:
+            with pool.connection() as conn:
+                print(f"Done. Wrote {ingest_dump(conn, args.dump_editions, args.dump_works)} rows from dumps.")
+        finally:
+            pool.close()
+        return
+
+    write_rows = write_refresh if args.refresh else write_rederive if args.rederive else write_enrichment
+
+    def flush(conn, updates):
+        with conn.cursor() as cur:
+            write_rows(cur, updates)
+
+    def write(updates):
+        # idempotent UPDATEs: replayed on a fresh connection if the link drops mid-flush
+        t0 = time.perf_counter()
+        pool.run(lambda conn: flush(conn, updates))
+        METRICS.observe("db_flush_seconds", time.perf_counter() - t0)
+        METRICS.inc("rows_written", len(updates))
+        METRICS.inc("commits")
+
+    # JOURNAL_PATH= (empty) disables the journal; --refresh results are mostly 304s and
+    # --rederive reads only the local cache: both are cheap to redo
+    journal = Journal(JOURNAL_PATH, JOURNAL_FSYNC) if JOURNAL_PATH and not (args.refresh or args.rederive) else None
+    if journal is not None:
+        n = replay_journal(pool, journal, write)
+        if n: print(f"Replayed {n} results journaled by the previous run.")
+
+    done = [0]  # ISBNs whose rows reached the writer (run_pipeline itself counts chunks)
+
+    def on_result(rows):
+        done[0] += len(rows)
+        bar.update(len(rows))
+
+    target = MAX_BOOKS if MAX_BOOKS > 0 else None
+    bar = tqdm(total=target, desc="Enriching")
+    if METRICS_PORT: METRICS.serve_prometheus(METRICS_PORT, METRICS_HOST)
+    reporter = Reporter(METRICS, METRICS_LOG_SEC, METRICS_FILE, derived=progress_fields).start()
+    install_signal_handlers()
+
+    try:
+        # producer -> CONCURRENCY fetchers (paced per host by LIMITERS) -> writer on this thread
+        # work unit = one OL_BATCH-sized chunk of (isbn, Todo) (see enrich_many)
+        if args.refresh:
+            chunks, work = chunked(iter_by_id(pool, REFRESH_SQL, target), max(1, OL_BATCH)), refresh_many
+        elif args.rederive:
+            chunks, work = chunked(iter_by_id(pool, REDERIVE_SQL, target), max(1, OL_BATCH)), rederive_many
+        else:
+            chunks, work = chunked(iter_candidates(pool, args.worker, target), max(1, OL_BATCH)), enrich_many
+        run_pipeline(
+            chunks, work, write,
+            workers=max(1, CONCURRENCY), queue_size=max(2, 2 * CONCURRENCY),
+            flush_rows=max(1, FLUSH_ROWS), flush_sec=FLUSH_SEC,
+            on_result=on_result,
+            flatten=True,
+            journal=journal,  # appended by the fetch worker, checkpointed after each write
+        )
+    finally:
+        bar.close()
+        reporter.stop()
+        pool.close()
+        if journal is not None:
+            journal.close()
+        if CACHE is not None:
+            CACHE.close()
 
-    print(f"Done. Processed ~{processed} ISBN candidates.")
+    print(f"Done. Processed {done[0]} ISBN candidates.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,105 @@
+# backend/scripts/enrich_books/explain_candidates.py
+# EXPLAIN check for the enrichment work queue: seeds a session-local TEMP
+# "books" table (shadows public.books for this connection only), runs
+# ensure_schema on it and verifies that fetching a page is an index-only
+# range read, with no Sort, that stops after one page of rows whatever the
+# catalogue size.
+#   python explain_candidates.py [--rows 100000,1000000]
+from __future__ import annotations
+
+import argparse, json
+
+from db import connect
+from enrich_books import (ATTEMPT_COOLDOWN_MIN, BATCH_SIZE, CANDIDATE_SQL, QUEUE_START, ensure_schema,
+                          fetch_isbns_to_enrich)
+
+
+def seed(cur, n: int) -> None:
+    cur.execute("DROP TABLE IF EXISTS pg_temp.books")
+    cur.execute("""
+        CREATE TEMP TABLE books (
+          id          bigserial PRIMARY KEY,
+          isbn13      text UNIQUE,
+          title       text NOT NULL DEFAULT '',
+          description text,
+          genres      text[] DEFAULT '{}',
+          page_count  int
+        )
+    """)
+    # ~70% fully enriched, the rest missing one field; some attempted recently;
+    # every 50th row an unusable ISBN that needs enrichment but must stay out of the index
+    cur.execute("""
+        INSERT INTO books (isbn13, description, genres, page_count)
+        SELECT CASE WHEN g %% 50 = 9 THEN 'bad-' || g ELSE '978' || lpad(g::text, 10, '0') END,
+               CASE WHEN g %% 10 < 8 THEN repeat('x', 40) END,
+               CASE WHEN g %% 10 < 9 THEN ARRAY['Fiction'] ELSE '{}' END,
+               CASE WHEN g %% 10 <> 3 THEN 250 END
+        FROM generate_series(1, %s) g
+    """, (n,))
+    ensure_schema(cur)
+    cur.execute("""
+        UPDATE books SET last_attempt_at = NOW() - (id % 7) * INTERVAL '1 hour', attempt_count = 1
+        WHERE id % 5 = 0
+    """)
+    cur.execute("VACUUM ANALYZE books")  # index-only scans need a fresh visibility map
+
+
+def explain(cur, after) -> dict:
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + CANDIDATE_SQL,
+                (ATTEMPT_COOLDOWN_MIN, after[0], after[1], BATCH_SIZE))
+    return cur.fetchone()[0][0]
+
+
+def scan_nodes(plan: dict):
+    yield plan
+    for p in plan.get("Plans", []):
+        yield from scan_nodes(p)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", default="100000,1000000")
+    ap.add_argument("--pages", type=int, default=20, help="keyset pages to walk before the deep probe")
+    args = ap.parse_args()
+
+    conn = connect()
+    conn.autocommit = True  # VACUUM cannot run inside a transaction
+    cur = conn.cursor()
+    ok = True
+    try:
+        print(f"{'rows':>9} {'probe':>6} {'node':>18} {'index':>28} {'buffers':>8} {'ms':>8}")
+        for n in (int(x) for x in args.rows.split(",")):
+            seed(cur, n)
+            probes = [("first", QUEUE_START)]
+            after, bad = QUEUE_START, 0
+            for _ in range(args.pages):
+                isbns, nxt = fetch_isbns_to_enrich(cur, BATCH_SIZE, after)
+                bad += sum(i.startswith("bad-") for i in isbns)
+                if nxt is None: break
+                after = nxt
+            if bad:
+                ok = False
+                print(f"{n:>9} handed out {bad} unusable ISBNs")
+            probes.append(("deep", after))
+
+            for name, pos in probes:
+                res = explain(cur, pos)
+                scan = next(p for p in scan_nodes(res["Plan"]) if "Scan" in p["Node Type"])
+                bufs = scan.get("Local Hit Blocks", 0) + scan.get("Local Read Blocks", 0)  # TEMP table
+                print(f"{n:>9} {name:>6} {scan['Node Type']:>18} {scan.get('Index Name', '-'):>28} "
+                      f"{bufs:>8} {res['Execution Time']:>8.2f}")
+                sorted_ = any(p["Node Type"] in ("Sort", "Incremental Sort") for p in scan_nodes(res["Plan"]))
+                if scan["Node Type"] != "Index Only Scan" or sorted_ or scan["Actual Rows"] > BATCH_SIZE:
+                    ok = False
+                    print(json.dumps(res["Plan"], indent=2))
+    finally:
+        cur.close()
+        conn.close()
+
+    print("OK: index-only, unsorted, one page read at every size" if ok
+          else "FAIL: candidate query is not an index-only range read")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
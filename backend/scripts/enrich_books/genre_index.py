@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/genre_index.py
+# In-memory candidate pre-filter: "books in these genres that finish in
+# about N days", answered without touching Postgres.
+#   python genre_index.py --genres Fantasy,Horror --pages-per-day 30 --days 10 [--all] [-n 20]
+#   python genre_index.py --save genre_index.json.gz   # build once, load elsewhere with --load
+#
+# Postings per (genre, page bucket), sorted by popularity score (best
+# first), so a query is a k-way merge that stops after `limit` hits.
+# refresh() re-reads only books enriched or re-scored since the last build.
+from __future__ import annotations
+
+import argparse, bisect, gzip, heapq, json, os, time
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from db import connect, stream
+from popularity import ensure_popularity_schema
+from watermarks import WATERMARK_LAG_S
+
+PAGE_BUCKETS = tuple(int(x) for x in os.getenv("PAGE_BUCKETS", "100,200,300,400,500,700,1000").split(","))
+UNKNOWN_PAGES = -1  # bucket for books without page_count
+
+Rec = Tuple[FrozenSet[str], Optional[int], float]  # genres, page_count, score
+Posting = Tuple[float, int]                        # (-score, book id): ascending = best first
+
+
+def page_bucket(pages: Optional[int]) -> int:
+    return UNKNOWN_PAGES if pages is None else bisect.bisect_right(PAGE_BUCKETS, pages)
+
+
+def ensure_genre_index_schema(cur):
+    ensure_popularity_schema(cur)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_books_enriched_at ON books (enriched_at);
+        CREATE INDEX IF NOT EXISTS idx_book_rating_agg_updated ON book_rating_agg (updated_at);
+    """)
+
+
+BOOKS_SQL = """
+  SELECT b.id, b.genres, b.page_count, COALESCE(a.score, 0), b.enriched_at, a.updated_at
+  FROM books b LEFT JOIN book_rating_agg a ON a.book_id = b.id
+"""
+
+
+class GenreIndex:
+    def __init__(self):
+        self.books: Dict[int, Rec] = {}
+        self.postings: Dict[Tuple[str, int], List[Posting]] = {}
+        self.enriched_mark: Optional[datetime] = None
+        self.popularity_mark: Optional[datetime] = None
+
+    # ---- maintenance ----
+    def _remove(self, book_id: int):
+        rec = self.books.pop(book_id, None)
+        if rec is None:
+            return
+        genres, pages, score = rec
+        key = (-score, book_id)
+        for g in genres:
+            plist = self.postings.get((g, page_bucket(pages)))
+            if plist:
+                i = bisect.bisect_left(plist, key)
+                if i < len(plist) and plist[i] == key:
+                    del plist[i]
+
+    def upsert(self, book_id: int, genres: Iterable[str], pages: Optional[int], score: float):
+        self._remove(book_id)
+        gs = frozenset(g for g in genres or () if g)
+        if not gs:
+            return  # nothing to find it by
+        self.books[book_id] = (gs, pages, float(score))
+        for g in gs:
+            bisect.insort(self.postings.setdefault((g, page_bucket(pages)), []), (-float(score), book_id))
+
+    def _load_rows(self, rows: Iterable[tuple], bulk: bool = False):
+        for id_, genres, pages, score, enriched_at, scored_at in rows:
+            if bulk:  # append now, sort each list once at the end
+                gs = frozenset(g for g in genres or () if g)
+                if gs:
+                    self.books[id_] = (gs, pages, float(score))
+                    for g in gs:
+                        self.postings.setdefault((g, page_bucket(pages)), []).append((-float(score), id_))
+            else:
+                self.upsert(id_, genres, pages, score)
+            if enriched_at and (self.enriched_mark is None or enriched_at > self.enriched_mark):
+                self.enriched_mark = enriched_at
+            if scored_at and (self.popularity_mark is None or scored_at > self.popularity_mark):
+                self.popularity_mark = scored_at
+        if bulk:
+            for plist in self.postings.values():
+                plist.sort()
+
+    @classmethod
+    def build(cls, conn) -> "GenreIndex":
+        idx = cls()
+        idx._load_rows(stream(conn, BOOKS_SQL, itersize=20_000, name="genre_index"), bulk=True)
+        conn.commit()
+        return idx
+
+    def refresh(self, conn) -> int:
+        """Re-read books enriched or re-scored since the marks (minus the late-commit window)."""
+        lag = timedelta(seconds=WATERMARK_LAG_S)
+        since_e = (self.enriched_mark - lag) if self.enriched_mark else datetime.min
+        since_p = (self.popularity_mark - lag) if self.popularity_mark else datetime.min
+        cur = conn.cursor()
+        cur.execute(BOOKS_SQL + """
+          WHERE b.id IN (SELECT id FROM books WHERE enriched_at > %s
+                         UNION SELECT book_id FROM book_rating_agg WHERE updated_at > %s)
+        """, (since_e, since_p))
+        rows = cur.fetchall()
+        cur.close()
+        conn.commit()
+        self._load_rows(rows)
+        return len(rows)
+
+    # ---- queries ----
+    def _lists(self, genre: str, buckets: Sequence[int]) -> List[List[Posting]]:
+        return [p for p in (self.postings.get((genre, b)) for b in buckets) if p]
+
+    def query(self, genres: Sequence[str], min_pages: Optional[int] = None, max_pages: Optional[int] = None,
+              match: str = "any", limit: int = 50, exclude: Iterable[int] = ()) -> List[int]:
+        """
+        Book ids by descending popularity that have any (match="any") or all
+        (match="all") of `genres` and min_pages <= page_count <= max_pages.
+        Books without a page_count only match when no page bound is given.
+        """
+        wanted = [g for g in dict.fromkeys(genres) if g]
+        if not wanted:
+            return []
+        if min_pages is None and max_pages is None:
+            buckets = [UNKNOWN_PAGES] + list(range(len(PAGE_BUCKETS) + 1))
+        else:
+            buckets = list(range(page_bucket(min_pages or 0), page_bucket(max_pages if max_pages is not None
+                                                                          else PAGE_BUCKETS[-1]) + 1))
+        if match == "all":
+            # walk the shortest genre's postings, check the rest per book
+            lists = min((self._lists(g, buckets) for g in wanted), key=lambda ls: sum(map(len, ls)))
+            need: Optional[FrozenSet[str]] = frozenset(wanted)
+        else:
+            lists = [l for g in wanted for l in self._lists(g, buckets)]
+            need = None
+
+        out: List[int] = []
+        seen: Set[int] = set(exclude)
+        for _, book_id in heapq.merge(*lists):
+            if book_id in seen:
+                continue
+            seen.add(book_id)
+            genres_, pages, _ = self.books[book_id]
+            if min_pages is not None and (pages is None or pages < min_pages): continue
+            if max_pages is not None and (pages is None or pages > max_pages): continue
+            if need is not None and not need <= genres_: continue
+            out.append(book_id)
+            if len(out) >= limit:
+                break
+        return out
+
+    def plan(self, genres: Sequence[str], pages_per_day: int, days: float, tolerance: float = 0.25,
+             **kw) -> List[int]:
+        """Books finishable in about `days` at `pages_per_day` (+/- tolerance)."""
+        target = pages_per_day * days
+        return self.query(genres, int(target * (1 - tolerance)), int(target * (1 + tolerance)), **kw)
+
+    # ---- snapshot ----
+    def save(self, path: str):
+        data = {"enriched_mark": self.enriched_mark.isoformat() if self.enriched_mark else None,
+                "popularity_mark": self.popularity_mark.isoformat() if self.popularity_mark else None,
+                "books": [[i, sorted(g), p, s] for i, (g, p, s) in self.books.items()]}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "GenreIndex":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        idx = cls()
+        idx._load_rows(((i, g, p, s, None, None) for i, g, p, s in data["books"]), bulk=True)
+        mark = lambda v: datetime.fromisoformat(v) if v else None
+        idx.enriched_mark, idx.popularity_mark = mark(data["enriched_mark"]), mark(data["popularity_mark"])
+        return idx
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Genre / length pre-filter index.")
+    ap.add_argument("--genres", default="")
+    ap.add_argument("--pages-per-day", type=int, default=20)
+    ap.add_argument("--days", type=float, default=14)
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--all", action="store_true", help="require every genre (default: any)")
+    ap.add_argument("-n", type=int, default=20)
+    ap.add_argument("--load", help="start from a snapshot, then refresh()")
+    ap.add_argument("--save", help="write a snapshot after building / refreshing")
+    args = ap.parse_args()
+
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        ensure_genre_index_schema(cur)
+        conn.commit()
+        cur.close()
+        t0 = time.perf_counter()
+        if args.load:
+            idx = GenreIndex.load(args.load)
+            t1 = time.perf_counter()
+            n = idx.refresh(conn)
+            print(f"Loaded {len(idx.books)} books in {t1 - t0:.2f}s, refreshed {n} in {time.perf_counter() - t1:.2f}s.")
+        else:
+            idx = GenreIndex.build(conn)
+            print(f"Built {len(idx.books)} books, {len(idx.postings)} postings lists in {time.perf_counter() - t0:.2f}s.")
+    finally:
+        conn.close()
+    if args.save:
+        idx.save(args.save)
+
+    genres = [g for g in args.genres.split(",") if g]
+    if genres:
+        t0 = time.perf_counter()
+        hits = idx.plan(genres, args.pages_per_day, args.days, args.tolerance,
+                        match="all" if args.all else "any", limit=args.n)
+        dt = (time.perf_counter() - t0) * 1000
+        for book_id in hits:
+            g, p, s = idx.books[book_id]
+            print(f"{book_id}\t{p}\t{s:.3f}\t{','.join(sorted(g))}")
+        print(f"{len(hits)} books in {dt:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# backend/scripts/enrich_books/genres.py
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set
+
+# Map subjects/categories to a controlled genre list (edit freely)
+GENRE_MAP = {
+    "fiction":"Fiction","nonfiction":"Non-Fiction","fantasy":"Fantasy",
+    "science fiction":"Sci-Fi","sci-fi":"Sci-Fi","ya":"Young Adult","young adult":"Young Adult",
+    "romance":"Romance","mystery":"Mystery","thriller":"Thriller","horror":"Horror",
+    "historical":"Historical","history":"History","biography":"Biography","autobiography":"Biography","memoir":"Memoir",
+    "self-help":"Self-Help","business":"Business","philosophy":"Philosophy","poetry":"Poetry",
+    "children":"Children","graphic novels":"Comics/Graphic","comics":"Comics/Graphic",
+    "technology":"Technology","computer":"Technology","programming":"Technology",
+    "science":"Science","math":"Math","religion":"Religion","art":"Art","travel":"Travel",
+}
+
+# Every key must start on a word boundary ("art" never hits "Stuart").
+# Keys listed here must also end on one (a plural "s" is allowed), so
+# "ya" does not hit "yachting" and "art" does not hit "Arthurian".
+# Other keys behave like stems: "computer" hits "Computers", "math" "Mathematics".
+WHOLE_WORD_KEYS = {"ya", "art"}
+
+LABEL_CACHE_SIZE = 1 << 17  # distinct subject strings remembered (they repeat a lot across books)
+
+_NONE: FrozenSet[str] = frozenset()
+
+
+def _key_matches_prefix_of(key: str, text: str, whole_word: Set[str]) -> bool:
+    """Would `key` match at position 0 of `text` (text = a longer key)?"""
+    if not text.startswith(key):
+        return False
+    if key not in whole_word:
+        return True
+    rest = text[len(key):]
+    rest = rest[1:] if rest.startswith("s") else rest
+    return not rest or not rest[0].isalnum()
+
+
+def compile_genre_matcher(genre_map: Dict[str, str],
+                          whole_word: Iterable[str] = ()) -> Callable[[str], FrozenSet[str]]:
+    """
+    Build a one-pass, per-label matcher: a single alternation regex anchored
+    at word starts. Alternatives are longest-first; genres of shorter keys
+    sharing the same start ("science" inside "science fiction") are
+    precomputed per key so overlapping hits are not lost. Results are memoised
+    per label.
+    """
+    whole_word = {k.lower() for k in whole_word}
+    keys = sorted({k.lower() for k in genre_map}, key=lambda k: (-len(k), k))
+    lower_map = {k.lower(): v for k, v in genre_map.items()}
+
+    alts, implied = [], {}
+    for k in keys:
+        alts.append(re.escape(k) + (r"s?\b" if k in whole_word else ""))
+        implied[k] = frozenset(lower_map[p] for p in keys if _key_matches_prefix_of(p, k, whole_word))
+
+    # zero-width lookahead -> findall tries every word start, so "fiction"
+    # inside "science fiction" is still found; the first-letter class lets the
+    # engine skip most word starts without walking the alternation
+    first = re.escape("".join(sorted({k[0] for k in keys})))
+    rx = re.compile(r"\b(?=[" + first + r"])(?=(" + "|".join(alts) + r"))")
+
+    @lru_cache(maxsize=LABEL_CACHE_SIZE)
+    def match_label(label: str) -> FrozenSet[str]:
+        hits = rx.findall(label.lower())
+        if not hits:
+            return _NONE
+        # whole-word plural ("arts") maps back to its key ("art")
+        return frozenset().union(*(implied[h] if h in implied else implied[h[:-1]] for h in hits))
+
+    return match_label
+
+
+_match_label = compile_genre_matcher(GENRE_MAP, WHOLE_WORD_KEYS)
+
+def normalize_genres(labels: List[str]) -> List[str]:
+    out: Set[str] = set()
+    for raw in labels or []:
+        if isinstance(raw, str):
+            out |= _match_label(raw)
+    return sorted(out)
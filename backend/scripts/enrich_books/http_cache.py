@@ -0,0 +1,90 @@
+# backend/scripts/enrich_books/http_cache.py
+from __future__ import annotations
+
+import json, sqlite3, threading, time, zlib
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# query params that must never end up in the cache key (or on disk)
+_SECRET_PARAMS = {"key"}
+
+
+def cache_key(url: str) -> str:
+    u = urlparse(url)
+    q = [(k, v) for k, v in parse_qsl(u.query, keep_blank_values=True) if k not in _SECRET_PARAMS]
+    return urlunparse(u._replace(query=urlencode(q, safe=":,/")))
+
+
+class ResponseCache:
+    """
+    SQLite-backed JSON response cache keyed by URL.
+    - 200s are kept for `ttl_s`, 404s (negative entries) for `neg_ttl_s`
+    - body is stored zlib-compressed; total size is capped at `max_bytes`,
+      least-recently-used rows are evicted first
+    """
+
+    def __init__(self, path: str, ttl_s: float, neg_ttl_s: float, max_bytes: int):
+        self.ttl_s, self.neg_ttl_s, self.max_bytes = ttl_s, neg_ttl_s, max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+              url         TEXT PRIMARY KEY,
+              status      INTEGER NOT NULL,
+              body        BLOB,
+              size        INTEGER NOT NULL,
+              fetched_at  REAL NOT NULL,
+              accessed_at REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size),0) FROM responses").fetchone()[0]
+
+    def get(self, url: str, allow_stale: bool = False) -> Optional[Tuple[int, dict]]:
+        """(status, payload) if cached and fresh (or allow_stale), else None."""
+        key, now = cache_key(url), time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, body, fetched_at FROM responses WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            status, body, fetched_at = row
+            ttl = self.ttl_s if status == 200 else self.neg_ttl_s
+            if not allow_stale and ttl > 0 and now - fetched_at > ttl:
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, key))
+        return status, (json.loads(zlib.decompress(body)) if body else {})
+
+    def put(self, url: str, status: int, payload: dict) -> None:
+        if status not in (200, 404):
+            return
+        key, now = cache_key(url), time.time()
+        body = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8")) if payload else None
+        size = len(key) + (len(body) if body else 0)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE url = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses(url, status, body, size, fetched_at, accessed_at) "
+                "VALUES (?,?,?,?,?,?)", (key, status, body, size, now, now))
+            self._bytes += size - (old[0] if old else 0)
+            if self.max_bytes > 0 and self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # drop LRU rows until we are 10% under the cap (amortises the DELETE)
+        goal = int(self.max_bytes * 0.9)
+        cur = self._db.execute("SELECT url, size FROM responses ORDER BY accessed_at")
+        victims, freed = [], 0
+        for url, size in cur:
+            if self._bytes - freed <= goal:
+                break
+            victims.append((url,))
+            freed += size
+        cur.close()
+        self._db.executemany("DELETE FROM responses WHERE url = ?", victims)
+        self._bytes -= freed
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,26 @@
+# backend/scripts/enrich_books/isbn.py
+# One ISBN rule for every script here (and KaggleBxImportRunner.normalizeIsbn):
+# books.isbn13 keys written by the loaders must match what the enricher looks up.
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+ISBN10_RE = re.compile(r"^[0-9]{9}[0-9Xx]$")
+ISBN13_RE = re.compile(r"^[0-9]{13}$")
+
+# the same test in SQL, for queries that must skip what isbn13() rejects
+ISBN_OK_SQL = r"regexp_replace(isbn13, '[^0-9Xx]', '', 'g') ~ '^([0-9]{13}|[0-9]{9}[0-9Xx])$'"
+
+
+def isbn13(s: Optional[str]) -> Optional[str]:
+    """Any ISBN-10/13 spelling -> 13 digits, None if it cannot be one."""
+    if not s: return None
+    s = re.sub(r"[^0-9Xx]", "", s)
+    if ISBN13_RE.match(s): return s
+    if ISBN10_RE.match(s):
+        core = "978" + s[:9]
+        total = sum((int(core[i]) * (3 if i % 2 else 1)) for i in range(12))
+        check = (10 - (total % 10)) % 10
+        return core + str(check)
+    return None
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/item_cf.py
+# Item-item collaborative filtering: top-k cosine neighbours per book.
+#   python item_cf.py [--out item_cf_index] [--db]
+#
+# ratings -> users x books CSR (chunked reads, ~20 bytes per rating while
+# loading) -> column-normalised -> S = X^T X in row blocks sized so that
+# no block's product exceeds CF_BLOCK_NNZ entries -> top-k per row.
+# Output: .npy files (np.load(mmap_mode="r")), optionally the
+# item_neighbors table.
+from __future__ import annotations
+
+import argparse, io, json, os, time
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from db import connect, stream_batches
+
+CF_TOPK             = int(os.getenv("CF_TOPK", "50"))
+CF_CHUNK            = int(os.getenv("CF_CHUNK", "100000"))        # ratings per fetch
+CF_BLOCK_NNZ        = int(os.getenv("CF_BLOCK_NNZ", "20000000"))  # max products per block (~240 MB)
+CF_MIN_ITEM_RATINGS = int(os.getenv("CF_MIN_ITEM_RATINGS", "5"))
+CF_MIN_USER_RATINGS = int(os.getenv("CF_MIN_USER_RATINGS", "2"))
+CF_IMPLICIT_VALUE   = float(os.getenv("CF_IMPLICIT_VALUE", "3"))  # value for BX rating 0 (implicit)
+CF_OUT_DIR          = os.getenv("CF_OUT_DIR", "item_cf_index")
+
+
+# ---- load ----
+def read_ratings(conn) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(user ids, book ids, values), streamed through a named cursor in CF_CHUNK pieces."""
+    us: List[np.ndarray] = []; bs: List[np.ndarray] = []; vs: List[np.ndarray] = []
+    for rows in stream_batches(conn, "SELECT user_id, book_id, rating FROM ratings WHERE rating IS NOT NULL",
+                               size=CF_CHUNK, name="cf_ratings"):
+        a = np.asarray(rows, dtype=np.int64)
+        us.append(a[:, 0]); bs.append(a[:, 1]); vs.append(a[:, 2].astype(np.float32))
+    conn.commit()
+    if not us:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    return np.concatenate(us), np.concatenate(bs), np.concatenate(vs)
+
+
+def build_matrix(users: np.ndarray, items: np.ndarray, ratings: np.ndarray,
+                 min_item: int = CF_MIN_ITEM_RATINGS, min_user: int = CF_MIN_USER_RATINGS
+                 ) -> Tuple[sp.csr_matrix, np.ndarray]:
+    """
+    users x items CSR with unit-norm columns, and the book id per column.
+    Items with < min_item ratings and users with < min_user are dropped:
+    they add cost, not signal.
+    """
+    vals = np.where(ratings == 0, CF_IMPLICIT_VALUE, ratings).astype(np.float32)
+
+    _, col = np.unique(items, return_inverse=True)
+    keep = np.bincount(col)[col] >= min_item
+    _, row = np.unique(users[keep], return_inverse=True)
+    keep_u = np.bincount(row)[row] >= min_user
+    users, items, vals = users[keep][keep_u], items[keep][keep_u], vals[keep][keep_u]
+
+    user_ids, row = np.unique(users, return_inverse=True)
+    item_ids, col = np.unique(items, return_inverse=True)
+    X = sp.csr_matrix((vals, (row.astype(np.int32), col.astype(np.int32))),
+                      shape=(len(user_ids), len(item_ids)), dtype=np.float32)
+    X.sum_duplicates()
+
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0).astype(np.float32)
+    X.data *= inv[X.indices]
+    return X, item_ids
+
+
+# ---- neighbours ----
+def row_blocks(X: sp.csr_matrix, XT: sp.csr_matrix, max_nnz: int) -> Iterator[Tuple[int, int]]:
+    """Item ranges whose product XT[a:b] @ X has at most ~max_nnz entries (upper bound)."""
+    est = XT @ np.diff(X.indptr).astype(np.int64)  # per item: sum of co-raters' row lengths
+    start, acc = 0, 0
+    for i, e in enumerate(est):
+        if acc and acc + e > max_nnz:
+            yield start, i
+            start, acc = i, 0
+        acc += e
+    if start < len(est):
+        yield start, len(est)
+
+
+def topk_neighbours(X: sp.csr_matrix, k: int = CF_TOPK, max_nnz: int = CF_BLOCK_NNZ
+                    ) -> Tuple[np.ndarray, np.ndarray]:
+    """(neighbour column index (n, k) int32, -1 padded; cosine (n, k) float32), best first."""
+    n = X.shape[1]
+    nbr = np.full((n, k), -1, dtype=np.int32)
+    score = np.zeros((n, k), dtype=np.float32)
+    XT = X.T.tocsr()  # items x users
+    for a, b in row_blocks(X, XT, max_nnz):
+        S = (XT[a:b] @ X).tocsr()
+        for i in range(b - a):
+            lo, hi = S.indptr[i], S.indptr[i + 1]
+            cols, vals = S.indices[lo:hi], S.data[lo:hi]
+            self_ = cols == a + i
+            if self_.any():
+                cols, vals = cols[~self_], vals[~self_]
+            if len(vals) > k:
+                sel = np.argpartition(-vals, k - 1)[:k]
+                cols, vals = cols[sel], vals[sel]
+            order = np.argsort(-vals, kind="stable")
+            nbr[a + i, :len(order)] = cols[order]
+            score[a + i, :len(order)] = vals[order]
+        del S
+    return nbr, score
+
+
+# ---- persist ----
+def save_neighbours(out_dir: str, item_ids: np.ndarray, nbr: np.ndarray, score: np.ndarray, meta: dict):
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "item_ids.npy"), item_ids.astype(np.int64))
+    np.save(os.path.join(out_dir, "neighbors.npy"), nbr)
+    np.save(os.path.join(out_dir, "scores.npy"), score.astype(np.float16))
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_neighbours(out_dir: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(book ids, neighbour index, scores), memory-mapped."""
+    load = lambda name: np.load(os.path.join(out_dir, name), mmap_mode="r")
+    return load("item_ids.npy"), load("neighbors.npy"), load("scores.npy")
+
+
+def write_neighbours_db(conn, item_ids: np.ndarray, nbr: np.ndarray, score: np.ndarray):
+    """Replace item_neighbors in one transaction (readers see old or new lists)."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS item_neighbors (
+          book_id     bigint   NOT NULL,
+          rank        smallint NOT NULL,
+          neighbor_id bigint   NOT NULL,
+          score       real     NOT NULL,
+          PRIMARY KEY (book_id, rank)
+        )
+    """)
+    cur.execute("TRUNCATE item_neighbors")
+    for a in range(0, len(item_ids), 10_000):
+        buf = io.StringIO()
+        for i in range(a, min(a + 10_000, len(item_ids))):
+            for r, (j, s) in enumerate(zip(nbr[i], score[i])):
+                if j < 0:
+                    break
+                buf.write(f"{item_ids[i]}\t{r}\t{item_ids[j]}\t{s:.5g}\n")
+        buf.seek(0)
+        cur.copy_expert("COPY item_neighbors (book_id, rank, neighbor_id, score) FROM STDIN", buf)
+    conn.commit()
+    cur.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Item-item cosine neighbours from ratings.")
+    ap.add_argument("--out", default=CF_OUT_DIR, help="directory for the .npy neighbour files")
+    ap.add_argument("--k", type=int, default=CF_TOPK)
+    ap.add_argument("--db", action="store_true", help="also replace the item_neighbors table")
+    args = ap.parse_args()
+
+    conn = connect()
+    try:
+        t0 = time.perf_counter()
+        users, items, ratings = read_ratings(conn)
+        t1 = time.perf_counter()
+        X, item_ids = build_matrix(users, items, ratings)
+        del users, items, ratings
+        t2 = time.perf_counter()
+        nbr, score = topk_neighbours(X, args.k)
+        t3 = time.perf_counter()
+        meta = {"k": args.k, "users": X.shape[0], "items": X.shape[1], "nnz": int(X.nnz),
+                "min_item_ratings": CF_MIN_ITEM_RATINGS, "min_user_ratings": CF_MIN_USER_RATINGS,
+                "implicit_value": CF_IMPLICIT_VALUE, "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        save_neighbours(args.out, item_ids, nbr, score, meta)
+        if args.db:
+            write_neighbours_db(conn, item_ids, nbr, score)
+        t4 = time.perf_counter()
+    finally:
+        conn.close()
+
+    print(f"{X.shape[0]} users x {X.shape[1]} books, {X.nnz} ratings: read {t1 - t0:.1f}s, "
+          f"matrix {t2 - t1:.1f}s, top-{args.k} {t3 - t2:.1f}s, write {t4 - t3:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# backend/scripts/enrich_books/journal.py
+from __future__ import annotations
+
+import json, os, sys, threading, time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class Journal:
+    """
+    Append-only JSONL log of fetched results not yet committed to Postgres.
+    - append(rows) -> id: one line per result, flushed (and fsync'ed) before
+      it is handed to the writer -> a crash loses no fetched result
+    - checkpoint(ids): those entries are committed; the file is rewritten
+      with the ones still in flight (truncated when none are). No ids: all
+    - read(): (fetched_at, rows) entries left by a previous run; a torn last
+      line (crash mid-write) is skipped
+    One process per file.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path, self.fsync = path, fsync
+        self._lock = threading.Lock()
+        self._f = open(path, "a+", encoding="utf-8")
+        self._seq = 0
+        self._pending: Dict[int, str] = {}  # id -> line, appended by this process, not yet committed
+
+    def append(self, rows: List[list]) -> int:
+        line = json.dumps({"t": time.time(), "rows": rows}, separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            if self.fsync:
+                os.fsync(self._f.fileno())
+            self._seq += 1
+            self._pending[self._seq] = line
+            return self._seq
+
+    def read(self) -> Iterator[Tuple[float, List[list]]]:
+        with self._lock:
+            self._f.flush()
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        for n, line in enumerate(lines, 1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"journal {self.path}: skipping unreadable line {n}", file=sys.stderr)
+                continue
+            yield entry["t"], entry["rows"]
+
+    def empty(self) -> bool:
+        with self._lock:
+            self._f.flush()
+            return os.path.getsize(self.path) == 0
+
+    def checkpoint(self, ids: Optional[Iterable[int]] = None) -> None:
+        with self._lock:
+            if ids is None:
+                self._pending.clear()
+            else:
+                for i in ids:
+                    self._pending.pop(i, None)
+            if not self._pending:
+                self._f.seek(0)
+                self._f.truncate()
+                self._f.flush()
+                if self.fsync:
+                    os.fsync(self._f.fileno())
+                return
+            # entries other workers appended meanwhile: new file, then atomic swap
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in self._pending.values())
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._f.close()  # Windows cannot replace an open file
+            os.replace(tmp, self.path)
+            self._f = open(self.path, "a+", encoding="utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
@@ -0,0 +1,185 @@
+# backend/scripts/enrich_books/metrics.py
+from __future__ import annotations
+
+import bisect, json, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(kw: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last = +Inf
+        self.sum, self.count = 0.0, 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound holding the q-quantile (coarse, but allocation-free)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    """In-process counters + histograms; no DB round trips. Thread-safe."""
+
+    def __init__(self, prefix: str = "enrich"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, n: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(buckets)
+            h.observe(value)
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def total(self, name: str, **match) -> float:
+        want = set(_labels(match))
+        with self._lock:
+            return sum(v for k, v in self._counters.get(name, {}).items() if want <= set(k))
+
+    # ---------- exposition ----------
+    def snapshot(self) -> dict:
+        """Flat dict for structured log lines."""
+        out: Dict[str, object] = {"uptime_s": round(time.time() - self.started, 1)}
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                for labels, v in sorted(series.items()):
+                    key = name + "".join(f".{lv}" for _, lv in labels)
+                    out[key] = int(v) if float(v).is_integer() else round(v, 3)
+            for name, series in sorted(self._hists.items()):
+                for labels, h in sorted(series.items()):
+                    key = name + "".join(f".{lv}" for _, lv in labels)
+                    out[key + ".count"] = h.count
+                    out[key + ".avg"] = round(h.sum / h.count, 4) if h.count else None
+                    out[key + ".p50"] = h.quantile(0.50)
+                    out[key + ".p99"] = h.quantile(0.99)
+        return out
+
+    def prometheus_text(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}_total"
+                if name in self._help: lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for labels, v in sorted(series.items()):
+                    lines.append(f"{full}{_fmt_labels(labels)} {v:g}")
+            for name, series in sorted(self._hists.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help: lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for labels, h in sorted(series.items()):
+                    cum = 0
+                    for bound, c in zip(list(h.bounds) + [float("inf")], h.counts):
+                        cum += c
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{full}_bucket{_fmt_labels(labels, ('le', le))} {cum}")
+                    lines.append(f"{full}_sum{_fmt_labels(labels)} {h.sum:g}")
+                    lines.append(f"{full}_count{_fmt_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)  # atomic for node_exporter's textfile collector
+
+    def serve_prometheus(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Unauthenticated /metrics; loopback unless `host` says otherwise."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # keep stdout for progress lines
+                pass
+
+        srv = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+        return srv
+
+
+class Reporter:
+    """
+    Every `interval` s: one JSON log line (+ optional Prometheus textfile).
+    `derived` adds computed fields (rates, ratios) to each line.
+    """
+
+    def __init__(self, metrics: Metrics, interval: float, prom_file: Optional[str] = None,
+                 derived: Optional[Callable[[], dict]] = None, stream=None):
+        self.metrics, self.interval, self.prom_file, self.derived = metrics, interval, prom_file, derived
+        self.stream = stream or sys.stderr
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-report", daemon=True)
+
+    def start(self) -> "Reporter":
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def emit(self, event: str = "progress"):
+        line = {"event": event, "ts": round(time.time(), 3),
+                **(self.derived() if self.derived else {}), **self.metrics.snapshot()}
+        print(json.dumps(line, separators=(",", ":")), file=self.stream, flush=True)
+        if self.prom_file:
+            self.metrics.write_prometheus_file(self.prom_file)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.emit()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        self.emit("final")
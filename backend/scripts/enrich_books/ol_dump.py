@@ -0,0 +1,64 @@
+# backend/scripts/enrich_books/ol_dump.py
+# Streaming readers for the OpenLibrary data dumps
+# (https://openlibrary.org/developers/dumps): gzipped TSV with columns
+#   type  key  revision  last_modified  json
+# Lines are filtered before json.loads, memory stays flat in dump size.
+from __future__ import annotations
+
+import gzip, io, json, re
+from typing import Callable, Iterator, Optional, Set, Tuple
+
+_ISBN_FIELDS_RE = re.compile(r'"isbn_1[03]"\s*:\s*\[([^\]]*)\]')
+_QUOTED_RE = re.compile(r'"([^"]*)"')
+
+
+def open_dump(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def iter_records(path: str) -> Iterator[Tuple[str, str, str]]:
+    """(type, key, raw json) per dump line; malformed lines are skipped."""
+    with open_dump(path) as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t", 4)
+            if len(parts) == 5:
+                yield parts[0], parts[1], parts[4]
+
+
+def scan_editions(path: str, wanted: Set[str],
+                  normalize: Callable[[str], Optional[str]]) -> Iterator[Tuple[str, dict]]:
+    """
+    (isbn13, edition record) for editions carrying an ISBN in `wanted`.
+    ISBNs are pulled out of the raw line with a regex; only matching lines
+    are parsed as JSON.
+    """
+    for typ, _key, raw in iter_records(path):
+        if typ != "/type/edition":
+            continue
+        hits = set()
+        for m in _ISBN_FIELDS_RE.finditer(raw):
+            for q in _QUOTED_RE.findall(m.group(1)):
+                i13 = normalize(q)
+                if i13 and i13 in wanted:
+                    hits.add(i13)
+        if not hits:
+            continue
+        try:
+            rec = json.loads(raw)
+        except ValueError:
+            continue
+        for i13 in hits:
+            yield i13, rec
+
+
+def scan_works(path: str, keys: Set[str]) -> Iterator[Tuple[str, dict]]:
+    """(work key, work record) for works in `keys`; filtered on the key column."""
+    for typ, key, raw in iter_records(path):
+        if typ != "/type/work" or key not in keys:
+            continue
+        try:
+            yield key, json.loads(raw)
+        except ValueError:
+            continue
@@ -0,0 +1,131 @@
+# backend/scripts/enrich_books/pipeline.py
+from __future__ import annotations
+
+import queue, threading, time
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()  # end-of-stream marker
+
+
+class PipelineError(RuntimeError):
+    pass
+
+
+def run_pipeline(produce: Iterable[T],
+                 work: Callable[[T], Optional[R]],
+                 write: Callable[[List[R]], None],
+                 workers: int,
+                 queue_size: int,
+                 flush_rows: int,
+                 flush_sec: float,
+                 on_result: Optional[Callable[[Optional[R]], None]] = None,
+                 flatten: bool = False,
+                 journal: Any = None) -> int:
+    """
+    Streaming producer -> N workers -> writer.
+
+    - `produce` is iterated on its own thread and feeds a bounded queue, so a
+      slow fetch stage back-pressures candidate selection
+    - `work` runs on `workers` threads; None results are dropped. With
+      `flatten`, work returns a list (e.g. one chunk of ISBNs -> many rows)
+    - `write` runs on the calling thread with up to `flush_rows` results, or
+      whatever arrived within `flush_sec` -> DB and API latency overlap, and
+      a crash loses at most one flush window
+    - `journal` (append(result) -> id, checkpoint(ids)): each non-empty result
+      is appended by the worker that produced it, before it is queued, and
+      checkpointed once written -> results still queued when a stage fails
+      or the process dies stay in the journal
+    Any exception stops all stages and is re-raised here. Returns #items produced.
+    """
+    todo: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    done: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    produced = [0]
+
+    def _put(q: "queue.Queue", item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(e: BaseException):
+        errors.append(e)
+        stop.set()
+
+    def producer():
+        try:
+            for item in produce:
+                if not _put(todo, item): return
+                produced[0] += 1
+        except BaseException as e:
+            _fail(e)
+        finally:
+            for _ in range(workers):
+                if not _put(todo, _DONE): break
+
+    def worker():
+        try:
+            while not stop.is_set():
+                try:
+                    item = todo.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                res = work(item)
+                jid = journal.append(res) if journal is not None and res else None
+                if not _put(done, (jid, res)): return
+        except BaseException as e:
+            _fail(e)
+        finally:
+            _put(done, _DONE)
+
+    threads = [threading.Thread(target=producer, name="produce", daemon=True)]
+    threads += [threading.Thread(target=worker, name=f"fetch-{i}", daemon=True) for i in range(workers)]
+    for t in threads: t.start()
+
+    buf: List[R] = []
+    ids: List[Any] = []  # journal entries in buf
+    last_flush = time.monotonic()
+    finished = 0
+    try:
+        while finished < workers and not stop.is_set():
+            timeout = max(0.0, flush_sec - (time.monotonic() - last_flush))
+            try:
+                got = done.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                if got is _DONE:
+                    finished += 1
+                    continue
+                jid, res = got
+                if jid is not None: ids.append(jid)
+                if on_result: on_result(res)
+                if res is not None:
+                    if flatten: buf.extend(res)
+                    else: buf.append(res)
+
+            if buf and (len(buf) >= flush_rows or time.monotonic() - last_flush >= flush_sec):
+                write(buf)
+                if ids: journal.checkpoint(ids)
+                buf, ids = [], []
+            if not buf:
+                last_flush = time.monotonic()
+        if buf:  # also on a failed stage: keep what was already fetched
+            write(buf)
+            if ids: journal.checkpoint(ids)
+    finally:
+        stop.set()
+        for t in threads: t.join(timeout=5)
+
+    if errors:
+        raise PipelineError(f"pipeline stage failed: {errors[0]!r}") from errors[0]
+    return produced[0]
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/popularity.py
+# Incremental replacement for the book_popularity materialized view.
+#   python popularity.py --full     # rebuild from all ratings
+#   python popularity.py            # apply rating deltas since the watermark
+#   python popularity.py --check    # compare against a full aggregation
+#   python popularity.py --rescore  # recompute every score (global mean drifted)
+#
+# book_rating_agg keeps (sum, count) per book; popularity_applied remembers
+# the rating each (user, book) contributed, so a changed rating applies
+# new - old. Every step is set-based and touches only the delta rows.
+# book_popularity_live has the same columns as the view, plus the score.
+# Deleted ratings are only reconciled by --full (--check reports them).
+from __future__ import annotations
+
+import argparse, os, time
+from datetime import timedelta
+from typing import List, Tuple
+
+from db import connect
+from watermarks import WATERMARK_LAG_S, ensure_watermarks, get_watermark, set_watermark
+
+JOB = "popularity"
+POP_PRIOR_COUNT = float(os.getenv("POP_PRIOR_COUNT", "10"))  # Bayesian prior weight, in ratings
+
+
+def ensure_popularity_schema(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS book_rating_agg (
+          book_id      bigint PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+          rating_sum   bigint NOT NULL DEFAULT 0,
+          rating_count int    NOT NULL DEFAULT 0,
+          score        real,
+          updated_at   timestamptz NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_book_rating_agg_score ON book_rating_agg (score DESC);
+        CREATE TABLE IF NOT EXISTS popularity_applied (
+          user_id bigint,
+          book_id bigint,
+          rating  smallint NOT NULL,
+          PRIMARY KEY (user_id, book_id)
+        );
+        CREATE TABLE IF NOT EXISTS popularity_totals (
+          id           boolean PRIMARY KEY DEFAULT true CHECK (id),
+          rating_sum   bigint NOT NULL DEFAULT 0,
+          rating_count bigint NOT NULL DEFAULT 0
+        );
+        INSERT INTO popularity_totals DEFAULT VALUES ON CONFLICT DO NOTHING;
+        CREATE INDEX IF NOT EXISTS idx_ratings_rated_at ON ratings (rated_at);
+        CREATE OR REPLACE VIEW book_popularity_live AS
+          SELECT b.id,
+                 COALESCE(a.rating_sum::real / NULLIF(a.rating_count, 0), 0) AS avg_rating,
+                 COALESCE(a.rating_count, 0) AS n_ratings,
+                 a.score
+          FROM books b LEFT JOIN book_rating_agg a ON a.book_id = b.id;
+    """)
+    ensure_watermarks(cur)
+
+
+# (C * global mean + sum) / (C + count); C = POP_PRIOR_COUNT
+RESCORE_SQL = """
+  UPDATE book_rating_agg a
+  SET score = (%(c)s * t.rating_sum::real / NULLIF(t.rating_count, 0) + a.rating_sum)
+              / (%(c)s + a.rating_count),
+      updated_at = now()
+  FROM popularity_totals t
+  {where}
+"""
+
+
+def rescore(cur, only_touched: bool = False) -> int:
+    where = "WHERE a.book_id IN (SELECT book_id FROM tmp_pop_books)" if only_touched else ""
+    cur.execute(RESCORE_SQL.format(where=where), {"c": POP_PRIOR_COUNT})
+    return cur.rowcount
+
+
+def full_rebuild(conn) -> int:
+    cur = conn.cursor()
+    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")  # watermark matches what we read
+    cur.execute("SELECT COALESCE(MAX(rated_at), 'epoch'::timestamptz) FROM ratings")
+    (mark,) = cur.fetchone()
+    cur.execute("TRUNCATE book_rating_agg, popularity_applied")
+    cur.execute("""
+        INSERT INTO popularity_applied (user_id, book_id, rating)
+        SELECT user_id, book_id, rating FROM ratings WHERE rating IS NOT NULL
+    """)
+    cur.execute("""
+        INSERT INTO book_rating_agg (book_id, rating_sum, rating_count)
+        SELECT book_id, SUM(rating), COUNT(*) FROM popularity_applied GROUP BY book_id
+    """)
+    books = cur.rowcount
+    cur.execute("""
+        UPDATE popularity_totals t SET rating_sum = s.rs, rating_count = s.rc
+        FROM (SELECT COALESCE(SUM(rating_sum), 0) rs, COALESCE(SUM(rating_count), 0) rc
+              FROM book_rating_agg) s
+    """)
+    rescore(cur)
+    set_watermark(cur, JOB, mark)
+    conn.commit()
+    cur.close()
+    return books
+
+
+def incremental(conn) -> Tuple[int, int]:
+    """-> (#rating deltas applied, #books touched)"""
+    cur = conn.cursor()
+    mark = get_watermark(cur, JOB)
+    if mark is None:
+        raise SystemExit("no watermark yet; run with --full first")
+
+    # deltas = ratings in the window whose value differs from what was applied
+    cur.execute("DROP TABLE IF EXISTS tmp_pop_delta, tmp_pop_books")
+    cur.execute("""
+        CREATE TEMP TABLE tmp_pop_delta ON COMMIT DROP AS
+        SELECT r.user_id, r.book_id, r.rating AS new_rating, a.rating AS old_rating, r.rated_at
+        FROM ratings r LEFT JOIN popularity_applied a USING (user_id, book_id)
+        WHERE r.rated_at > %s AND r.rating IS NOT NULL
+          AND a.rating IS DISTINCT FROM r.rating
+    """, (mark - timedelta(seconds=WATERMARK_LAG_S),))
+    deltas = cur.rowcount
+    cur.execute("SELECT MAX(rated_at) FROM tmp_pop_delta")
+    (new_mark,) = cur.fetchone()
+    if not deltas:
+        conn.commit()
+        cur.close()
+        return 0, 0
+
+    cur.execute("""
+        CREATE TEMP TABLE tmp_pop_books ON COMMIT DROP AS
+        SELECT book_id,
+               SUM(new_rating - COALESCE(old_rating, 0)) AS d_sum,
+               COUNT(*) FILTER (WHERE old_rating IS NULL) AS d_count
+        FROM tmp_pop_delta GROUP BY book_id
+    """)
+    books = cur.rowcount
+    cur.execute("""
+        INSERT INTO book_rating_agg AS a (book_id, rating_sum, rating_count)
+        SELECT book_id, d_sum, d_count FROM tmp_pop_books
+        ON CONFLICT (book_id) DO UPDATE
+          SET rating_sum   = a.rating_sum + EXCLUDED.rating_sum,
+              rating_count = a.rating_count + EXCLUDED.rating_count
+    """)
+    cur.execute("""
+        UPDATE popularity_totals t
+        SET rating_sum = t.rating_sum + d.s, rating_count = t.rating_count + d.c
+        FROM (SELECT SUM(d_sum) s, SUM(d_count) c FROM tmp_pop_books) d
+    """)
+    cur.execute("""
+        INSERT INTO popularity_applied (user_id, book_id, rating)
+        SELECT user_id, book_id, new_rating FROM tmp_pop_delta
+        ON CONFLICT (user_id, book_id) DO UPDATE SET rating = EXCLUDED.rating
+    """)
+    rescore(cur, only_touched=True)
+    set_watermark(cur, JOB, new_mark)
+    conn.commit()
+    cur.close()
+    return deltas, books
+
+
+CHECK_SQL = """
+  SELECT COALESCE(f.book_id, a.book_id), f.s, f.c, a.rating_sum, a.rating_count
+  FROM (SELECT book_id, SUM(rating) s, COUNT(rating) c FROM ratings
+        WHERE rating IS NOT NULL GROUP BY book_id) f
+  FULL JOIN (SELECT * FROM book_rating_agg WHERE rating_count > 0) a ON a.book_id = f.book_id
+  WHERE f.s IS DISTINCT FROM a.rating_sum OR f.c IS DISTINCT FROM a.rating_count
+  ORDER BY 1
+"""
+
+def check(conn, show: int = 20) -> List[tuple]:
+    """Books whose (sum, count) differ from a full aggregation over ratings."""
+    cur = conn.cursor()
+    cur.execute(CHECK_SQL)
+    bad = cur.fetchall()
+    cur.execute("""
+        SELECT t.rating_sum = s.rs AND t.rating_count = s.rc
+        FROM popularity_totals t,
+             (SELECT COALESCE(SUM(rating), 0) rs, COUNT(rating) rc FROM ratings) s
+    """)
+    (totals_ok,) = cur.fetchone()
+    conn.commit()
+    cur.close()
+    for book_id, s, c, a_s, a_c in bad[:show]:
+        print(f"  book {book_id}: ratings sum={s} count={c}  agg sum={a_s} count={a_c}")
+    if not totals_ok:
+        print("  popularity_totals differ from ratings")
+        bad.append((None, None, None, None, None))
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Incrementally maintained book popularity.")
+    g = ap.add_mutually_exclusive_group()
+    g.add_argument("--full", action="store_true", help="rebuild from all ratings")
+    g.add_argument("--check", action="store_true", help="compare against a full aggregation")
+    g.add_argument("--rescore", action="store_true", help="recompute every score")
+    args = ap.parse_args()
+
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        ensure_popularity_schema(cur)
+        conn.commit()
+        t0 = time.perf_counter()
+        if args.full:
+            books = full_rebuild(conn)
+            print(f"Full rebuild: {books} books in {time.perf_counter() - t0:.1f}s.")
+        elif args.check:
+            bad = check(conn)
+            print("OK: aggregates match ratings" if not bad else f"FAIL: {len(bad)} mismatches (run --full)")
+            raise SystemExit(1 if bad else 0)
+        elif args.rescore:
+            n = rescore(cur)
+            conn.commit()
+            print(f"Rescored {n} books in {time.perf_counter() - t0:.1f}s.")
+        else:
+            deltas, books = incremental(conn)
+            print(f"Incremental: {deltas} rating deltas, {books} books in {time.perf_counter() - t0:.2f}s.")
+        cur.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
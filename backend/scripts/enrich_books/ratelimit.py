@@ -0,0 +1,128 @@
+# backend/scripts/enrich_books/ratelimit.py
+from __future__ import annotations
+
+import threading, time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/sec, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:  # 0 = unlimited
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveBucket(TokenBucket):
+    """
+    TokenBucket whose rate follows the upstream's answers (AIMD):
+    - fast (<= latency_target) non-error answers add `increase` req/s per
+      second, whatever the current rate, up to max_rate
+    - 429 / 5xx / network errors multiply the rate by `decrease`, at most once
+      per `cooldown` s (requests already in flight were sent at the old rate)
+    - Retry-After stops handing out tokens until it has passed; that, not a
+      deep cut, is what answers a spent quota window
+    One instance per host, shared by all fetcher threads.
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.2, max_rate: Optional[float] = None,
+                 increase: float = 2.0, decrease: float = 0.8, latency_target: float = 1.5,
+                 cooldown: float = 1.0, burst: Optional[float] = None):
+        super().__init__(rate, burst or 1)
+        self.min_rate = min_rate
+        self.max_rate = max(rate, max_rate or rate * 4)
+        self.increase, self.decrease = increase, decrease
+        self.latency_target, self.cooldown = latency_target, cooldown
+        self.cuts = 0
+        self._paused_until = 0.0
+        self._last_cut = -cooldown
+        self._last_answer = time.monotonic()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+        super().acquire()
+
+    def feedback(self, status: Optional[int], latency: float, retry_after: Optional[float] = None) -> None:
+        """status None = network error; latency in seconds; retry_after in seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._tokens = 0.0
+            if status is None or status == 429 or status >= 500:
+                if now - self._last_cut >= self.cooldown:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._last_cut = now
+                    self.cuts += 1
+            elif latency <= self.latency_target and now - self._last_cut >= self.cooldown:
+                # per second, not per answer: the gaps between answers sum to the elapsed time
+                self.rate = min(self.max_rate, self.rate + self.increase * min(1.0, now - self._last_answer))
+            self._last_answer = now
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) -> seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class HostLimiters:
+    """
+    Maps a URL to the bucket of its host (suffix match, e.g. 'openlibrary.org';
+    keys with a port, e.g. '127.0.0.1:8089', match host:port exactly).
+    """
+
+    def __init__(self, buckets: Dict[str, TokenBucket]):
+        self.buckets = buckets
+
+    def for_url(self, url: str) -> Optional[TokenBucket]:
+        u = urlparse(url)
+        host, netloc = (u.hostname or "").lower(), u.netloc.lower()
+        for suffix, bucket in self.buckets.items():
+            if netloc == suffix or host == suffix or host.endswith("." + suffix):
+                return bucket
+        return None
+
+    def acquire(self, url: str) -> None:
+        b = self.for_url(url)
+        if b: b.acquire()
+
+    def feedback(self, url: str, status: Optional[int], latency: float, retry_after: Optional[float] = None) -> None:
+        b = self.for_url(url)
+        if isinstance(b, AdaptiveBucket):
+            b.feedback(status, latency, retry_after)
+
+    def rates(self) -> Dict[str, float]:
+        return {k: round(b.rate, 2) for k, b in self.buckets.items()}
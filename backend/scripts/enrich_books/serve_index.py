@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/serve_index.py
+# Read-only serving artifact for per-request recommendation lookups.
+#   python serve_index.py build [--out serve_index] [--dtype int8|float16] [--cf item_cf_index]
+#   python serve_index.py query --book-id 123 [--genres Fantasy,Horror] [--max-pages 300]
+#
+# Directory of .npy files, opened with np.load(mmap_mode="r"); startup
+# touches no rows and pages fault in as they are read:
+#   ids            int64  (n,)      book id per row; rows grouped by IVF list
+#   vectors        int8 | float16 (n, 384), unit-norm embeddings
+#   scales         float32 (n,)     int8 only: row dequantisation scale
+#   centroids      float32 (nlist, 384), list_offsets int64 (nlist + 1,)
+#   genre_bits     uint64 (n,)      bit i = meta["genres"][i]
+#   pages          int32  (n,)      page_count, -1 unknown
+#   neighbors      int32  (n, k)    row index of the k nearest books, -1 padded
+#   neighbor_scores float16 (n, k)
+#   cf_neighbors / cf_scores        optional, from item_cf.py
+#   sorted_ids / sorted_rows        book id -> row by binary search
+from __future__ import annotations
+
+import argparse, json, os, time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SERVE_DIR     = os.getenv("SERVE_DIR", "serve_index")
+SERVE_DTYPE   = os.getenv("SERVE_DTYPE", "int8")        # int8 | float16
+SERVE_NLIST   = int(os.getenv("SERVE_NLIST", "1024"))   # IVF lists (~sqrt(n) x 2)
+SERVE_NPROBE  = int(os.getenv("SERVE_NPROBE", "8"))     # lists scanned per query
+SERVE_TOPK    = int(os.getenv("SERVE_TOPK", "50"))      # precomputed neighbours per book
+MAX_GENRE_BITS = 64
+
+Hit = Tuple[int, float]  # (book id, cosine)
+
+
+# ---- build ----
+def read_books(conn) -> Tuple[np.ndarray, np.ndarray, List[List[str]], np.ndarray]:
+    from db import stream  # build-time only: keeps the loader free of DB deps
+    from embed_books import parse_vector
+    rows = stream(conn, """
+        SELECT id, embedding::text, genres, page_count FROM books
+        WHERE embedding IS NOT NULL ORDER BY id
+    """, name="serve_books")
+    ids, vecs, genres, pages = [], [], [], []
+    for id_, emb, g, pc in rows:
+        ids.append(id_); vecs.append(parse_vector(emb)); genres.append(g or []); pages.append(pc or -1)
+    conn.commit()
+    if not ids:
+        raise SystemExit("no embedded books; run embed_books.py first")
+    X = np.vstack(vecs)
+    X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-9)
+    return np.asarray(ids, np.int64), X, genres, np.asarray(pages, np.int32)
+
+
+def kmeans(X: np.ndarray, k: int, iters: int = 10, sample: int = 256, seed: int = 7) -> np.ndarray:
+    """Spherical k-means on a sample of ~k*sample rows; unit-norm centroids."""
+    rnd = np.random.default_rng(seed)
+    k = max(1, min(k, len(X)))
+    S = X[rnd.choice(len(X), min(len(X), k * sample), replace=False)]
+    C = S[rnd.choice(len(S), k, replace=False)].copy()
+    for _ in range(iters):
+        a = assign(S, C)
+        for j in range(k):
+            m = S[a == j]
+            C[j] = m.sum(axis=0) if len(m) else S[rnd.integers(len(S))]
+        C /= np.maximum(np.linalg.norm(C, axis=1, keepdims=True), 1e-9)
+    return C
+
+
+def assign(X: np.ndarray, C: np.ndarray, block: int = 65536) -> np.ndarray:
+    return np.concatenate([np.argmax(X[a:a + block] @ C.T, axis=1) for a in range(0, len(X), block)])
+
+
+def ivf_neighbours(X: np.ndarray, C: np.ndarray, offsets: np.ndarray, k: int, nprobe: int
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k per row (self excluded), one blocked matmul per list against its nprobe nearest lists."""
+    n = len(X)
+    nbr = np.full((n, k), -1, np.int32)
+    sc = np.zeros((n, k), np.float16)
+    near = np.argsort(-(C @ C.T), axis=1)[:, :max(1, nprobe)]
+    for L in range(len(C)):
+        a, b = offsets[L], offsets[L + 1]
+        if a == b:
+            continue
+        cand = np.concatenate([np.arange(offsets[j], offsets[j + 1]) for j in near[L]])
+        S = X[a:b] @ X[cand].T
+        S[cand[None, :] == np.arange(a, b)[:, None]] = -np.inf
+        kk = min(k, len(cand) - 1)
+        if kk <= 0:
+            continue
+        top = np.argpartition(-S, kk - 1, axis=1)[:, :kk]
+        vals = np.take_along_axis(S, top, axis=1)
+        order = np.argsort(-vals, axis=1)
+        nbr[a:b, :kk] = cand[np.take_along_axis(top, order, axis=1)]
+        sc[a:b, :kk] = np.take_along_axis(vals, order, axis=1)
+    return nbr, sc
+
+
+def quantise(X: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    if dtype == "float16":
+        return X.astype(np.float16), None
+    scale = np.maximum(np.abs(X).max(axis=1), 1e-9) / 127.0
+    return np.round(X / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+
+def genre_vocab(genres: Sequence[Sequence[str]]) -> List[str]:
+    counts: dict = {}
+    for gs in genres:
+        for g in gs:
+            counts[g] = counts.get(g, 0) + 1
+    return sorted(counts, key=lambda g: (-counts[g], g))[:MAX_GENRE_BITS]
+
+
+def genre_mask(vocab: Sequence[str], wanted: Iterable[str]) -> int:
+    pos = {g: i for i, g in enumerate(vocab)}
+    return sum(1 << pos[g] for g in wanted if g in pos)
+
+
+def build_index(conn, out: str, dtype: str = SERVE_DTYPE, nlist: int = SERVE_NLIST,
+                k: int = SERVE_TOPK, cf_dir: Optional[str] = None) -> dict:
+    ids, X, genres, pages = read_books(conn)
+    C = kmeans(X, min(nlist, max(1, len(X) // 32)))
+    lists = assign(X, C)
+    order = np.argsort(lists, kind="stable")
+    ids, X, pages, lists = ids[order], X[order], pages[order], lists[order]
+    genres = [genres[i] for i in order]
+    offsets = np.zeros(len(C) + 1, np.int64)
+    np.cumsum(np.bincount(lists, minlength=len(C)), out=offsets[1:])
+
+    vocab = genre_vocab(genres)
+    bits = np.fromiter((genre_mask(vocab, g) for g in genres), dtype=np.uint64, count=len(ids))
+    nbr, nbr_sc = ivf_neighbours(X, C, offsets, k, nprobe=max(SERVE_NPROBE, 16))
+    vecs, scales = quantise(X, dtype)
+
+    os.makedirs(out, exist_ok=True)
+    save = lambda name, a: np.save(os.path.join(out, f"{name}.npy"), a)
+    save("ids", ids); save("vectors", vecs); save("centroids", C.astype(np.float32))
+    save("list_offsets", offsets); save("genre_bits", bits); save("pages", pages)
+    save("neighbors", nbr); save("neighbor_scores", nbr_sc)
+    id_order = np.argsort(ids)
+    save("sorted_ids", ids[id_order]); save("sorted_rows", id_order.astype(np.int32))
+    if scales is not None:
+        save("scales", scales)
+    if cf_dir:
+        from item_cf import load_neighbours
+        cf_ids, cf_nbr, cf_sc = load_neighbours(cf_dir)
+        rows = _rows_for(ids[id_order], id_order, cf_ids)  # cf column -> our row (-1 if not embedded)
+        cf = np.full((len(ids), cf_nbr.shape[1]), -1, np.int32)
+        cf_scores = np.zeros(cf.shape, np.float16)
+        have = rows >= 0
+        mapped = np.where(cf_nbr[have] >= 0, rows[np.maximum(cf_nbr[have], 0)], -1)
+        sc = np.where(mapped >= 0, cf_sc[have], 0)
+        # neighbours that are not embedded drop out; keep the rest in rank order
+        order = np.argsort(mapped < 0, axis=1, kind="stable")
+        cf[rows[have]] = np.take_along_axis(mapped, order, axis=1)
+        cf_scores[rows[have]] = np.take_along_axis(sc, order, axis=1)
+        save("cf_neighbors", cf); save("cf_scores", cf_scores)
+
+    meta = {"dim": int(X.shape[1]), "n": int(len(ids)), "dtype": dtype, "nlist": int(len(C)), "k": k,
+            "genres": vocab, "cf": bool(cf_dir),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    with open(os.path.join(out, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _rows_for(sorted_ids: np.ndarray, sorted_rows: np.ndarray, book_ids: np.ndarray) -> np.ndarray:
+    """Row per book id, -1 where the book is not in the index."""
+    book_ids = np.asarray(book_ids, np.int64)
+    if not len(sorted_ids):
+        return np.full(len(book_ids), -1, np.int64)
+    pos = np.minimum(np.searchsorted(sorted_ids, book_ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[pos] == book_ids, sorted_rows[pos], -1).astype(np.int64)
+
+
+# ---- serve ----
+class ServingIndex:
+    """mmap-backed lookups; safe to share across threads (read-only)."""
+
+    def __init__(self, path: str = SERVE_DIR):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        opt = lambda name: os.path.exists(os.path.join(path, f"{name}.npy"))
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.ids, self.vectors = load("ids"), load("vectors")
+        self.scales = load("scales") if opt("scales") else None
+        self.centroids, self.offsets = np.asarray(load("centroids")), np.asarray(load("list_offsets"))
+        self.genre_bits, self.pages = load("genre_bits"), load("pages")
+        self.neighbors, self.neighbor_scores = load("neighbors"), load("neighbor_scores")
+        self.cf_neighbors = load("cf_neighbors") if opt("cf_neighbors") else None
+        self.cf_scores = load("cf_scores") if opt("cf_scores") else None
+        self.sorted_ids, self.sorted_rows = load("sorted_ids"), load("sorted_rows")
+        self.genres = self.meta["genres"]
+
+    def row_of(self, book_id: int) -> int:
+        return int(_rows_for(self.sorted_ids, self.sorted_rows, [book_id])[0])
+
+    def _keep(self, rows: np.ndarray, genres: Optional[Iterable[str]],
+              min_pages: Optional[int], max_pages: Optional[int]) -> np.ndarray:
+        keep = np.ones(len(rows), bool)
+        if genres:
+            mask = np.uint64(genre_mask(self.genres, genres))
+            keep &= (self.genre_bits[rows] & mask) != 0
+        if min_pages is not None or max_pages is not None:
+            p = self.pages[rows]
+            keep &= p >= 0
+            if min_pages is not None: keep &= p >= min_pages
+            if max_pages is not None: keep &= p <= max_pages
+        return keep
+
+    def _score(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        V = self.vectors[rows].astype(np.float32)
+        s = V @ q
+        return s * self.scales[rows] if self.scales is not None else s
+
+    def search(self, q: Sequence[float], n: int = 10, nprobe: int = SERVE_NPROBE,
+               genres: Optional[Iterable[str]] = None, min_pages: Optional[int] = None,
+               max_pages: Optional[int] = None, exclude_rows: Iterable[int] = ()) -> List[Hit]:
+        """Top-n books by cosine to `q` (IVF, nprobe lists; widened until n pass the filter)."""
+        q = np.asarray(q, np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-9)
+        order = np.argsort(-(self.centroids @ q))
+        excl = np.asarray(list(exclude_rows), np.int64)
+        probe, done, found = max(1, nprobe), 0, []
+        while done < len(order):
+            lists = order[done:probe]
+            done = probe
+            rows = np.concatenate([np.arange(self.offsets[L], self.offsets[L + 1]) for L in lists])
+            rows = rows[self._keep(rows, genres, min_pages, max_pages)]
+            if len(excl):
+                rows = rows[~np.isin(rows, excl)]
+            if len(rows):
+                found.append((rows, self._score(rows, q)))
+            if sum(len(r) for r, _ in found) >= n:
+                break
+            probe *= 2
+        if not found:
+            return []
+        rows = np.concatenate([r for r, _ in found]); s = np.concatenate([s for _, s in found])
+        top = np.argpartition(-s, min(n, len(s)) - 1)[:n] if len(s) > n else np.arange(len(s))
+        top = top[np.argsort(-s[top])]
+        return [(int(self.ids[rows[i]]), float(s[i])) for i in top]
+
+    def similar(self, book_id: int, n: int = 10, genres: Optional[Iterable[str]] = None,
+                min_pages: Optional[int] = None, max_pages: Optional[int] = None,
+                source: str = "embedding") -> List[Hit]:
+        """Precomputed neighbours of a book, filtered; falls back to search() if too few pass."""
+        row = self.row_of(book_id)
+        if row < 0:
+            return []
+        cf = source == "cf" and self.cf_neighbors is not None
+        nb = np.asarray(self.cf_neighbors[row] if cf else self.neighbors[row])
+        sc = np.asarray(self.cf_scores[row] if cf else self.neighbor_scores[row], np.float32)
+        valid = nb >= 0
+        nb, sc = nb[valid], sc[valid]
+        keep = self._keep(nb, genres, min_pages, max_pages)
+        nb, sc = nb[keep], sc[keep]
+        if len(nb) >= n or cf:  # CF lists have no vector-space fallback
+            return [(int(self.ids[r]), float(s)) for r, s in zip(nb[:n], sc[:n])]
+        return self.search(self.vector(row), n, genres=genres, min_pages=min_pages,
+                           max_pages=max_pages, exclude_rows=[row])
+
+    def vector(self, row: int) -> np.ndarray:
+        v = np.asarray(self.vectors[row], np.float32)
+        return v * self.scales[row] if self.scales is not None else v
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build or query the mmap serving index.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--out", default=SERVE_DIR)
+    b.add_argument("--dtype", choices=["int8", "float16"], default=SERVE_DTYPE)
+    b.add_argument("--nlist", type=int, default=SERVE_NLIST)
+    b.add_argument("--k", type=int, default=SERVE_TOPK)
+    b.add_argument("--cf", help="item_cf.py output dir to embed as cf_neighbors")
+    q = sub.add_parser("query")
+    q.add_argument("--index", default=SERVE_DIR)
+    q.add_argument("--book-id", type=int, required=True)
+    q.add_argument("-n", type=int, default=10)
+    q.add_argument("--genres", default="")
+    q.add_argument("--min-pages", type=int)
+    q.add_argument("--max-pages", type=int)
+    q.add_argument("--source", choices=["embedding", "cf"], default="embedding")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        from db import connect
+        conn = connect()
+        try:
+            t0 = time.perf_counter()
+            meta = build_index(conn, args.out, args.dtype, args.nlist, args.k, args.cf)
+        finally:
+            conn.close()
+        print(f"Built {meta['n']} books, {meta['nlist']} lists, {meta['dtype']} -> {args.out} "
+              f"in {time.perf_counter() - t0:.1f}s.")
+        return
+
+    t0 = time.perf_counter()
+    idx = ServingIndex(args.index)
+    t1 = time.perf_counter()
+    genres = [g for g in args.genres.split(",") if g]
+    hits = idx.similar(args.book_id, args.n, genres, args.min_pages, args.max_pages, args.source)
+    t2 = time.perf_counter()
+    for book_id, score in hits:
+        print(f"{book_id}\t{score:.4f}")
+    print(f"open {1000 * (t1 - t0):.2f} ms, query {1000 * (t2 - t1):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/stub_api.py
+# Local stand-in for the OpenLibrary and Google Books endpoints enrich_books.py
+# calls, with per-API quota windows (429 + Retry-After once a window's budget
+# is spent) and latency that grows when clients push past a soft rate.
+# Answers are deterministic per ISBN, so runs are repeatable; 200s carry an
+# ETag / Last-Modified and If-None-Match gets a 304.
+#   python stub_api.py --port 8089 --ol-quota 30 --gb-quota 10 --window 1
+#   OL_BASE_URL=http://127.0.0.1:8089 GB_BASE_URL=http://127.0.0.1:8089 python enrich_books.py
+from __future__ import annotations
+
+import argparse, hashlib, json, math, random, threading, time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"  # answers never change
+GENRES = ["Fantasy", "Science fiction", "History", "Romance", "Mystery", "Poetry", "Biography", "Horror"]
+
+
+class Quota:
+    """`limit` requests per fixed `window` seconds; latency rises above `soft` req/s."""
+
+    def __init__(self, limit: int, window: float, soft: Optional[float] = None, base_ms: float = 20):
+        self.limit, self.window = limit, window
+        self.soft = soft or 0.8 * limit / window
+        self.base_ms = base_ms
+        self._start = time.monotonic()
+        self._used = 0
+        self._recent: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def take(self) -> Tuple[Optional[float], float]:
+        """-> (retry_after seconds or None if allowed, simulated latency seconds)"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._start >= self.window:
+                self._start, self._used = now - (now - self._start) % self.window, 0
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            over = max(0.0, len(self._recent) / self.soft - 1) if self.soft > 0 else 0.0
+            latency = self.base_ms / 1000 * (1 + 4 * over)
+            if self.limit > 0 and self._used >= self.limit:
+                return max(0.05, self.window - (now - self._start)), latency
+            self._used += 1
+            return None, latency
+
+
+def _h(isbn: str) -> int:
+    return int(hashlib.md5(isbn.encode()).hexdigest()[:8], 16)
+
+
+def edition(isbn: str) -> Optional[dict]:
+    """~10% of ISBNs are unknown; some editions leave genres/description to the work."""
+    h = _h(isbn)
+    if h % 10 == 0:
+        return None
+    rec = {"isbn_13": [isbn], "works": [{"key": f"/works/OL{h % 1000003}W"}]}
+    if h % 5:
+        rec["number_of_pages"] = 80 + h % 900
+    elif h % 3:
+        rec["pagination"] = f"xii, {80 + h % 900} p."
+    if h % 4 == 0:
+        rec["subjects"] = [GENRES[h % len(GENRES)]]
+    if h % 6 == 0:
+        rec["description"] = f"Edition notes for {isbn}, a stub book."
+    return rec
+
+
+def work(key: str) -> dict:
+    h = _h(key)
+    out = {"key": key, "subjects": [GENRES[h % len(GENRES)], GENRES[(h >> 4) % len(GENRES)]]}
+    if h % 3:
+        out["description"] = {"type": "/type/text", "value": f"Work {key}: a deterministic stub description."}
+    return out
+
+
+def volume(isbn: str) -> Optional[dict]:
+    h = _h(isbn[::-1])
+    if h % 4 == 0:
+        return None
+    return {"volumeInfo": {"title": f"Stub {isbn}", "pageCount": 100 + h % 700,
+                           "categories": [GENRES[h % len(GENRES)]],
+                           "description": f"Google description of {isbn}.",
+                           "industryIdentifiers": [{"type": "ISBN_13", "identifier": isbn}]}}
+
+
+class StubAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ol: Optional[Quota] = None,
+                 gb: Optional[Quota] = None, error_rate: float = 0.0):
+        self.quotas = {"openlibrary": ol or Quota(0, 1), "google": gb or Quota(0, 1)}
+        self.error_rate = error_rate
+        self.counts: Counter = Counter()  # (api, status) -> n
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubAPI":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, api: str, status: int):
+        with self._lock:
+            self.counts[(api, status)] += 1
+
+    def route(self, path: str, query: dict) -> Tuple[str, int, Optional[dict]]:
+        """-> (api, status, body)"""
+        if path.startswith("/books/v1/volumes"):
+            q = (query.get("q") or [""])[0]
+            isbns = [t.split(":", 1)[1] for t in q.split(" OR ") if t.startswith("isbn:")]
+            items = [v for v in (volume(i) for i in isbns) if v]
+            return "google", 200, {"kind": "books#volumes", "totalItems": len(items), **({"items": items} if items else {})}
+        if path == "/api/books":
+            keys = (query.get("bibkeys") or [""])[0].split(",")
+            return "openlibrary", 200, {k: {"details": e} for k in keys if k.startswith("ISBN:")
+                                        for e in (edition(k[5:]),) if e}
+        if path.startswith("/isbn/") and path.endswith(".json"):
+            e = edition(path[6:-5])
+            return ("openlibrary", 200, e) if e else ("openlibrary", 404, None)
+        if path.startswith("/works/") and path.endswith(".json"):
+            return "openlibrary", 200, work(path[:-5])
+        return "openlibrary", 404, None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                u = urlparse(self.path)
+                api, status, body = stub.route(u.path, parse_qs(u.query))
+                retry_after, latency = stub.quotas[api].take()
+                time.sleep(latency)
+                headers = {}
+                if retry_after is not None:
+                    status, body = 429, {"error": "quota exceeded"}
+                    headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+                elif random.random() < stub.error_rate:
+                    status, body = 503, {"error": "unavailable"}
+                data = json.dumps(body if body is not None else {"error": "notfound"}).encode()
+                if status == 200:  # validators for conditional requests (--refresh)
+                    headers["ETag"] = '"' + hashlib.md5(data).hexdigest()[:16] + '"'
+                    headers["Last-Modified"] = LAST_MODIFIED
+                    if self.headers.get("If-None-Match") == headers["ETag"]:
+                        status, data = 304, b""
+                stub._count(api, status)
+                self.send_response(status)
+                if status != 304:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub OpenLibrary / Google Books API with quota windows.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--window", type=float, default=1.0, help="quota window, seconds")
+    ap.add_argument("--ol-quota", type=int, default=30, help="OpenLibrary requests per window (0 = unlimited)")
+    ap.add_argument("--gb-quota", type=int, default=10, help="Google requests per window (0 = unlimited)")
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of random 503s")
+    args = ap.parse_args()
+    stub = StubAPI(args.host, args.port, Quota(args.ol_quota, args.window, base_ms=args.latency_ms),
+                   Quota(args.gb_quota, args.window, base_ms=args.latency_ms), args.error_rate)
+    print(f"Stub API on {stub.url} (Ctrl-C to stop)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(stub.counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# backend/scripts/enrich_books/taste_vectors.py
+# Rating-weighted taste vectors -> user_profile.taste_embedding.
+#   python taste_vectors.py --full   # one vectorised pass over ratings x embeddings
+#   python taste_vectors.py          # incremental: ratings with rated_at past the watermark
+#
+# Per user we keep the running sum of weight * book embedding
+# (user_taste_state) and the weight already applied per rating
+# (taste_applied), so a new rating adds w*e and a changed one adds
+# (w_new - w_old)*e -> cost is O(new ratings), not O(user history).
+# Deleted ratings and re-embedded books are only picked up by --full.
+from __future__ import annotations
+
+import argparse, io, os, time
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embed_books import EMBED_DIM, parse_vector, vector_literal
+from db import connect, stream_batches
+from watermarks import WATERMARK_LAG_S, ensure_watermarks, get_watermark, set_watermark
+
+JOB = "taste_vectors"
+TASTE_CHUNK     = int(os.getenv("TASTE_CHUNK", "50000"))         # ratings per read / write
+RATING_CENTER   = float(os.getenv("RATING_CENTER", "5"))         # explicit rating with weight 0
+IMPLICIT_WEIGHT = float(os.getenv("IMPLICIT_WEIGHT", "0.2"))     # BX rating 0 = implicit interaction
+
+
+def ensure_taste_schema(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS user_taste_state (
+          user_id    bigint PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+          n_ratings  int    NOT NULL,
+          weight_sum real   NOT NULL,
+          vec_sum    VECTOR({EMBED_DIM}) NOT NULL,
+          updated_at timestamptz NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS taste_applied (
+          user_id bigint,
+          book_id bigint,
+          weight  real NOT NULL,
+          PRIMARY KEY (user_id, book_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_ratings_rated_at ON ratings (rated_at);
+    """)
+    ensure_watermarks(cur)
+
+
+def rating_weights(r: np.ndarray) -> np.ndarray:
+    """0 -> implicit weight; 1..10 -> centred on RATING_CENTER, scaled to [-1, 1]."""
+    r = r.astype(np.float32)
+    return np.where(r == 0, IMPLICIT_WEIGHT, (r - RATING_CENTER) / (10 - RATING_CENTER)).astype(np.float32)
+
+
+def taste_of(vec_sum: np.ndarray) -> Optional[str]:
+    n = float(np.linalg.norm(vec_sum))
+    return vector_literal(vec_sum / n) if n > 1e-9 else None
+
+
+def load_embeddings(cur, book_ids: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(sorted book ids, float32 matrix); all rated books, or just `book_ids`."""
+    if book_ids is None:
+        cur.execute("""
+            SELECT b.id, b.embedding::text FROM books b
+            WHERE b.embedding IS NOT NULL AND EXISTS (SELECT 1 FROM ratings r WHERE r.book_id = b.id)
+            ORDER BY b.id
+        """)
+    else:
+        cur.execute("SELECT id, embedding::text FROM books WHERE id = ANY(%s) AND embedding IS NOT NULL ORDER BY id",
+                    (list(book_ids),))
+    ids, mat = [], []
+    for id_, emb in cur:
+        ids.append(id_); mat.append(parse_vector(emb))
+    if not ids:
+        return np.empty(0, np.int64), np.empty((0, EMBED_DIM), np.float32)
+    return np.asarray(ids, np.int64), np.vstack(mat)
+
+
+def lookup(ids: np.ndarray, wanted: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(row index, found mask) of `wanted` in sorted `ids`."""
+    if not len(ids):
+        return np.zeros(len(wanted), np.int64), np.zeros(len(wanted), bool)
+    idx = np.minimum(np.searchsorted(ids, wanted), len(ids) - 1)
+    return idx, ids[idx] == wanted
+
+
+# ---- writes ----
+def _copy(cur, table: str, columns: str, rows: Iterable[Sequence]):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v) for v in row) + "\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buf)
+
+
+def write_states(cur, states: List[Tuple[int, int, float, np.ndarray]]):
+    """Upsert (user_id, n, weight_sum, vec_sum) into the running state and user_profile."""
+    if not states:
+        return
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS tmp_taste (
+          user_id bigint, n_ratings int, weight_sum real, vec_sum text, taste text
+        )
+    """)
+    cur.execute("TRUNCATE tmp_taste")
+    _copy(cur, "tmp_taste", "user_id, n_ratings, weight_sum, vec_sum, taste",
+          ((u, n, f"{w:.6g}", vector_literal(v), taste_of(v)) for u, n, w, v in states))
+    cur.execute("""
+        INSERT INTO user_taste_state (user_id, n_ratings, weight_sum, vec_sum, updated_at)
+        SELECT user_id, n_ratings, weight_sum, vec_sum::vector, now() FROM tmp_taste
+        ON CONFLICT (user_id) DO UPDATE
+          SET n_ratings = EXCLUDED.n_ratings, weight_sum = EXCLUDED.weight_sum,
+              vec_sum = EXCLUDED.vec_sum, updated_at = EXCLUDED.updated_at
+    """)
+    cur.execute("""
+        INSERT INTO user_profile (user_id, taste_embedding)
+        SELECT user_id, taste::vector FROM tmp_taste
+        ON CONFLICT (user_id) DO UPDATE SET taste_embedding = EXCLUDED.taste_embedding
+    """)
+
+
+def write_applied(cur, rows: Iterable[Tuple[int, int, float]]):
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS tmp_applied (user_id bigint, book_id bigint, weight real)")
+    cur.execute("TRUNCATE tmp_applied")
+    _copy(cur, "tmp_applied", "user_id, book_id, weight", rows)  # full float repr: replays compare exactly
+    cur.execute("""
+        INSERT INTO taste_applied (user_id, book_id, weight)
+        SELECT user_id, book_id, weight FROM tmp_applied
+        ON CONFLICT (user_id, book_id) DO UPDATE SET weight = EXCLUDED.weight
+    """)
+
+
+# ---- full rebuild ----
+def full_rebuild(conn) -> int:
+    """
+    One transaction: stream ratings ordered by user, gather embeddings by
+    index, weight and segment-sum per user with np.add.reduceat.
+    """
+    cur = conn.cursor()
+    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")  # watermark matches what we read
+    cur.execute("SELECT COALESCE(MAX(rated_at), 'epoch'::timestamptz) FROM ratings")
+    (mark,) = cur.fetchone()
+    book_ids, E = load_embeddings(cur)
+    cur.execute("TRUNCATE user_taste_state, taste_applied")
+
+    chunks = stream_batches(conn, "SELECT user_id, book_id, rating FROM ratings WHERE rating IS NOT NULL "
+                                  "ORDER BY user_id", size=TASTE_CHUNK, name="taste_ratings")
+    carry: Optional[list] = None  # last user of the previous chunk may continue in the next
+    users = 0
+    for rows in chunks:
+        a = np.asarray(rows, dtype=np.int64)
+        idx, ok = lookup(book_ids, a[:, 1])
+        a, idx = a[ok], idx[ok]
+        if not len(a):
+            continue
+        u, w = a[:, 0], rating_weights(a[:, 2])
+        starts = np.flatnonzero(np.r_[True, u[1:] != u[:-1]])
+        sums = np.add.reduceat(E[idx] * w[:, None], starts, axis=0)
+        wsum = np.add.reduceat(np.abs(w), starts)
+        cnt = np.diff(np.r_[starts, len(u)])
+
+        states = [[int(u[s]), int(c), float(ws), vs] for s, c, ws, vs in zip(starts, cnt, wsum, sums)]
+        if carry is not None:
+            if carry[0] == states[0][0]:
+                states[0] = [carry[0], carry[1] + states[0][1], carry[2] + states[0][2], carry[3] + states[0][3]]
+            else:
+                states.insert(0, carry)
+        carry = states.pop()
+        write_states(cur, [tuple(s) for s in states])
+        write_applied(cur, zip(u.tolist(), a[:, 1].tolist(), w.tolist()))
+        users += len(states)
+    if carry is not None:
+        write_states(cur, [tuple(carry)])
+        users += 1
+
+    # profiles whose ratings all disappeared (or lost their embeddings)
+    cur.execute("""
+        UPDATE user_profile p SET taste_embedding = NULL
+        WHERE taste_embedding IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM user_taste_state s WHERE s.user_id = p.user_id)
+    """)
+    set_watermark(cur, JOB, mark)
+    conn.commit()
+    cur.close()
+    return users
+
+
+# ---- incremental ----
+def apply_deltas(cur, rows: List[tuple]) -> int:
+    """rows: (user_id, book_id, rating, applied weight or None). Returns #users touched."""
+    a = np.asarray([(u, b, r) for u, b, r, _ in rows], dtype=np.int64)
+    old = np.asarray([0.0 if w is None else w for *_, w in rows], dtype=np.float32)
+    is_new = np.asarray([w is None for *_, w in rows])
+    new = rating_weights(a[:, 2])
+
+    book_ids, E = load_embeddings(cur, np.unique(a[:, 1]).tolist())
+    idx, ok = lookup(book_ids, a[:, 1])
+    keep = ok & (is_new | (new != old))  # unchanged replays (lag window) cost nothing
+    if not keep.any():
+        return 0
+    a, idx, old, new, is_new = a[keep], idx[keep], old[keep], new[keep], is_new[keep]
+
+    order = np.argsort(a[:, 0], kind="stable")
+    a, idx, old, new, is_new = a[order], idx[order], old[order], new[order], is_new[order]
+    u = a[:, 0]
+    starts = np.flatnonzero(np.r_[True, u[1:] != u[:-1]])
+    d_vec = np.add.reduceat(E[idx] * (new - old)[:, None], starts, axis=0)
+    d_w = np.add.reduceat(np.abs(new) - np.abs(old), starts)
+    d_n = np.add.reduceat(is_new.astype(np.int64), starts)
+    touched = u[starts].tolist()
+
+    cur.execute("""
+        SELECT user_id, n_ratings, weight_sum, vec_sum::text FROM user_taste_state
+        WHERE user_id = ANY(%s) FOR UPDATE
+    """, (touched,))
+    current: Dict[int, Tuple[int, float, np.ndarray]] = {
+        uid: (n, w, parse_vector(v)) for uid, n, w, v in cur.fetchall()}
+    zero = np.zeros(EMBED_DIM, np.float32)
+    states = []
+    for uid, dv, dw, dn in zip(touched, d_vec, d_w, d_n):
+        n, w, v = current.get(uid, (0, 0.0, zero))
+        states.append((uid, int(n + dn), float(w + dw), v + dv))
+    write_states(cur, states)
+    write_applied(cur, zip(u.tolist(), a[:, 1].tolist(), new.tolist()))
+    return len(touched)
+
+
+def incremental(conn) -> Tuple[int, int]:
+    cur = conn.cursor()
+    mark = get_watermark(cur, JOB)
+    conn.commit()
+    if mark is None:
+        raise SystemExit("no watermark yet; run with --full first")
+
+    since = mark - timedelta(seconds=WATERMARK_LAG_S)
+    chunks = stream_batches(conn, """
+        SELECT r.user_id, r.book_id, r.rating, a.weight, r.rated_at
+        FROM ratings r LEFT JOIN taste_applied a USING (user_id, book_id)
+        WHERE r.rated_at > %s AND r.rating IS NOT NULL
+        ORDER BY r.rated_at
+    """, (since,), size=TASTE_CHUNK, name="taste_deltas")
+    n_ratings = n_users = 0
+    for rows in chunks:
+        n_users += apply_deltas(cur, [(u, b, r, w) for u, b, r, w, _ in rows])
+        n_ratings += len(rows)
+        mark = max(mark, rows[-1][4])
+    set_watermark(cur, JOB, mark)
+    conn.commit()
+    cur.close()
+    return n_ratings, n_users
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Maintain user_profile.taste_embedding from ratings.")
+    ap.add_argument("--full", action="store_true", help="rebuild all taste vectors in one pass")
+    args = ap.parse_args()
+
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        ensure_taste_schema(cur)
+        conn.commit()
+        cur.close()
+        t0 = time.perf_counter()
+        if args.full:
+            users = full_rebuild(conn)
+            print(f"Full rebuild: {users} users in {time.perf_counter() - t0:.1f}s.")
+        else:
+            n, users = incremental(conn)
+            print(f"Incremental: {n} ratings, {users} users updated in {time.perf_counter() - t0:.1f}s.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# backend/scripts/enrich_books/tests/test_copy_rows.py
+import csv, io, json
+
+import enrich_books as eb
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.sql, self.copied, self.rowcount = [], None, 0
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+
+    def copy_expert(self, sql, buf):
+        self.copied = buf.read()
+        self.rowcount = self.copied.count("\n")
+
+
+def copied_rows(rows):
+    cur = RecordingCursor()
+    eb.upsert_enrichment_copy(cur, rows)
+    return {r[0]: r for r in csv.reader(io.StringIO(cur.copied))}, cur
+
+
+def test_pg_text_array_escapes_quotes_and_backslashes():
+    assert eb._pg_text_array([]) == "{}"
+    assert eb._pg_text_array(["Sci-Fi", 'Say "hi"', "a\\b", "x,y"]) == '{"Sci-Fi","Say \\"hi\\"","a\\\\b","x,y"}'
+
+
+def test_nulls_are_unquoted_empty_fields():
+    prov = {"page_count": {"src": "google", "conf": 0.8, "via": "volumes"}}
+    rows, cur = copied_rows([(320, [], None, "9780000000001", prov)])
+    i13, pages, genres, desc, pc_src, pc_conf, g_src, g_conf, patch = rows["9780000000001"]
+    assert (pages, genres, desc) == ("320", "{}", "")
+    assert (pc_src, pc_conf, g_src, g_conf) == ("google", "0.8", "", "")
+    assert json.loads(patch) == prov
+    # empty genres must not count as "enriched"
+    assert "NULLIF(t.genres, '{}') IS NOT NULL" in cur.sql[-1]
+
+
+def test_text_with_delimiters_round_trips():
+    desc = 'Line one,\n"quoted" line two\\'
+    rows, _ = copied_rows([(None, ["Fantasy"], desc, "9780000000002", {})])
+    assert rows["9780000000002"][3] == desc
+
+
+def test_last_row_per_isbn_wins():
+    rows, _ = copied_rows([(100, [], None, "9780000000003", {}), (200, [], None, "9780000000003", {})])
+    assert len(rows) == 1 and rows["9780000000003"][1] == "200"
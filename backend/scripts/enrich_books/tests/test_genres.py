@@ -0,0 +1,61 @@
+# backend/scripts/enrich_books/tests/test_genres.py
+import pytest
+
+from genres import GENRE_MAP, WHOLE_WORD_KEYS, compile_genre_matcher, normalize_genres
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("Fantasy fiction", ["Fantasy", "Fiction"]),
+    ("Science fiction", ["Fiction", "Sci-Fi", "Science"]),  # overlapping keys all count
+    ("Young adult fiction", ["Fiction", "Young Adult"]),
+    ("YA", ["Young Adult"]),
+    ("Computers", ["Technology"]),                            # stem keys match longer words
+    ("Mathematics", ["Math"]),
+    ("Art", ["Art"]),
+    ("Arts, Modern", ["Art"]),                                # whole-word key, plural allowed
+    ("Comics & Graphic Novels", ["Comics/Graphic"]),
+])
+def test_maps_labels(label, expected):
+    assert normalize_genres([label]) == expected
+
+
+@pytest.mark.parametrize("label", [
+    "Maya civilization",                     # "ya" not at a word start
+    "Himalaya Mountains",
+    "Stuart, Mary, Queen of Scots, 1542-1587",  # "art" not at a word start
+    "Arthurian legends",                     # "art" must end on a word boundary
+    "Yachting",                              # nor "ya"
+    "Large type books",
+])
+def test_no_false_positives(label):
+    assert normalize_genres([label]) == []
+
+
+def test_multiple_labels_are_merged_and_sorted():
+    assert normalize_genres(["Poetry", "History", "Poetry, American"]) == ["History", "Poetry"]
+
+
+def test_ignores_non_strings_and_empty_input():
+    assert normalize_genres(None) == []
+    assert normalize_genres([None, 3, {"name": "Fantasy"}]) == []
+
+
+def test_case_insensitive():
+    assert normalize_genres(["HORROR TALES"]) == ["Horror"]
+
+
+def test_matches_legacy_loop_where_it_was_right():
+    # the old nested loop: every key as a plain substring
+    def legacy(labels):
+        return sorted({v for raw in labels for k, v in GENRE_MAP.items() if k in raw.strip().lower()})
+    for label in ["Fiction, romance, general", "Detective and mystery stories", "Self-help techniques",
+                  "Business & Economics", "Biography & Autobiography", "Description and travel"]:
+        assert normalize_genres([label]) == legacy([label])
+
+
+def test_custom_map_and_whole_words():
+    match = compile_genre_matcher({"sea": "Nautical", "sea stories": "Adventure"}, whole_word={"sea"})
+    assert match("sea stories") == frozenset({"Nautical", "Adventure"})
+    assert match("seashells") == frozenset()
+    assert match("Seas") == frozenset({"Nautical"})
+    assert WHOLE_WORD_KEYS <= set(GENRE_MAP)
@@ -0,0 +1,99 @@
+# backend/scripts/enrich_books/tests/test_http_cache.py
+import pytest
+
+import http_cache
+from http_cache import ResponseCache, cache_key
+
+URL = "https://openlibrary.org/isbn/9780000000001.json"
+
+
+class Clock:
+    def __init__(self, t: float = 1_000_000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(http_cache.time, "time", c)
+    return c
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "cache.sqlite"), ttl_s=100, neg_ttl_s=10, max_bytes=0)
+    yield c
+    c.close()
+
+
+def test_hit_within_ttl(cache, clock):
+    cache.put(URL, 200, {"number_of_pages": 320})
+    clock.t += 99
+    assert cache.get(URL) == (200, {"number_of_pages": 320})
+
+
+def test_expires_after_ttl_unless_stale_allowed(cache, clock):
+    cache.put(URL, 200, {"number_of_pages": 320})
+    clock.t += 101
+    assert cache.get(URL) is None
+    assert cache.get(URL, allow_stale=True) == (200, {"number_of_pages": 320})  # --offline
+
+
+def test_404_is_a_negative_entry_with_its_own_ttl(cache, clock):
+    cache.put(URL, 404, {})
+    clock.t += 9
+    assert cache.get(URL) == (404, {})
+    clock.t += 2
+    assert cache.get(URL) is None
+
+
+def test_errors_are_not_cached(cache):
+    cache.put(URL, 503, {"error": "busy"})
+    cache.put(URL, 429, {})
+    assert cache.get(URL) is None
+
+
+def test_zero_ttl_never_expires(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "c.sqlite"), ttl_s=0, neg_ttl_s=0, max_bytes=0)
+    c.put(URL, 200, {"a": 1})
+    clock.t += 10 ** 9
+    assert c.get(URL) == (200, {"a": 1})
+    c.close()
+
+
+def test_api_key_is_not_part_of_the_key():
+    a = "https://www.googleapis.com/books/v1/volumes?q=isbn:9780000000001&key=SECRET"
+    b = "https://www.googleapis.com/books/v1/volumes?q=isbn:9780000000001"
+    assert cache_key(a) == cache_key(b)
+    assert "SECRET" not in cache_key(a)
+
+
+def test_persists_across_instances(tmp_path, clock):
+    path = str(tmp_path / "c.sqlite")
+    c = ResponseCache(path, ttl_s=100, neg_ttl_s=10, max_bytes=0)
+    c.put(URL, 200, {"a": 1})
+    c.close()
+    c = ResponseCache(path, ttl_s=100, neg_ttl_s=10, max_bytes=0)
+    assert c.get(URL) == (200, {"a": 1})
+    c.close()
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    c = ResponseCache(str(tmp_path / "c.sqlite"), ttl_s=0, neg_ttl_s=0, max_bytes=600)
+    payload = {"description": "x" * 2000}  # compresses to a few dozen bytes
+    urls = [f"https://openlibrary.org/isbn/97800000000{i:02d}.json" for i in range(12)]
+    for u in urls[:4]:
+        c.put(u, 200, payload)
+        clock.t += 1
+    c.get(urls[0])  # touched: now the most recently used
+    clock.t += 1
+    for u in urls[4:]:
+        c.put(u, 200, payload)
+        clock.t += 1
+    assert c.get(urls[1]) is None  # oldest untouched entry went first
+    assert c.get(urls[-1]) is not None
+    assert c._bytes <= 600
+    c.close()
@@ -0,0 +1,81 @@
+# backend/scripts/enrich_books/tests/test_journal.py
+import os
+
+import pytest
+
+from journal import Journal
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.jsonl")
+
+
+def rows_of(j):
+    return [rows for _, rows in j.read()]
+
+
+def test_append_read_roundtrip(path):
+    j = Journal(path, fsync=False)
+    j.append([[1, ["Fantasy"], None, "9780000000001", {}]])
+    j.append([[None, [], "Déjà vu", "9780000000002", {}]])
+    assert rows_of(j) == [[[1, ["Fantasy"], None, "9780000000001", {}]],
+                          [[None, [], "Déjà vu", "9780000000002", {}]]]
+    assert not j.empty()
+    j.close()
+
+
+def test_checkpoint_all_truncates(path):
+    j = Journal(path, fsync=False)
+    j.append([["a"]])
+    j.checkpoint()
+    assert j.empty() and rows_of(j) == []
+    j.append([["b"]])  # still appendable after the truncate
+    assert rows_of(j) == [[["b"]]]
+    j.close()
+
+
+def test_checkpoint_ids_keeps_in_flight_entries(path):
+    j = Journal(path, fsync=True)
+    a, b, c = j.append([["a"]]), j.append([["b"]]), j.append([["c"]])
+    j.checkpoint([a, c])  # b is still queued for the writer
+    assert rows_of(j) == [[["b"]]]
+    d = j.append([["d"]])
+    assert rows_of(j) == [[["b"]], [["d"]]]
+    j.checkpoint([b, d])
+    assert j.empty()
+    assert not os.path.exists(path + ".tmp")
+    j.close()
+
+
+def test_survives_reopen_for_replay(path):
+    j = Journal(path, fsync=True)
+    j.append([["a"]])
+    j.close()  # crash / second signal: nothing checkpointed
+
+    j = Journal(path, fsync=False)
+    assert rows_of(j) == [[["a"]]]
+    j.checkpoint()  # after replay
+    assert j.empty()
+    j.close()
+
+
+def test_torn_last_line_is_skipped(path, capsys):
+    j = Journal(path, fsync=False)
+    j.append([["a"]])
+    j.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"t": 1, "rows": [["b"')  # crash mid-write
+
+    j = Journal(path, fsync=False)
+    assert rows_of(j) == [[["a"]]]
+    assert "skipping unreadable line 2" in capsys.readouterr().err
+    j.close()
+
+
+def test_entries_carry_fetch_time(path):
+    j = Journal(path, fsync=False)
+    j.append([["a"]])
+    (t, _), = j.read()
+    assert isinstance(t, float) and t > 0
+    j.close()
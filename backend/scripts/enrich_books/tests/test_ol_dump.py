@@ -0,0 +1,89 @@
+# backend/scripts/enrich_books/tests/test_ol_dump.py
+import os
+
+import pytest
+
+import enrich_books as eb
+from ol_dump import scan_editions, scan_works
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+EDITIONS = os.path.join(FIXTURES, "ol_editions.txt.gz")
+WORKS = os.path.join(FIXTURES, "ol_works.txt.gz")
+
+ALL = frozenset(eb.FIELDS)
+
+
+def test_scan_editions_matches_isbn10_and_isbn13():
+    wanted = {"9780195153446", "9780002005012"}
+    got = [(i13, rec["key"]) for i13, rec in scan_editions(EDITIONS, wanted, eb.isbn13)]
+    # OL1M via its ISBN-10, OL4M via the ISBN-13 of the same book
+    assert got == [("9780195153446", "/books/OL1M"), ("9780002005012", "/books/OL2M"),
+                   ("9780195153446", "/books/OL4M")]
+
+
+def test_scan_works_filters_on_key():
+    got = [(k, w.get("subjects")) for k, w in scan_works(WORKS, {"/works/OL1W", "/works/OL404W"})]
+    assert got == [("/works/OL1W", ["Fantasy fiction"]), ("/works/OL1W", ["Horror"])]
+
+
+class FakeConn:
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    written = {}
+
+    def copy(cur, rows):
+        for row in rows:
+            written[row[3]] = row
+        return len(rows)
+
+    monkeypatch.setattr(eb, "upsert_enrichment_copy", copy)
+
+    def run(queue, works=WORKS):
+        monkeypatch.setattr(eb, "load_queue_isbns", lambda conn: dict(queue))
+        n = eb.ingest_dump(FakeConn(), EDITIONS, works)
+        assert n == len(written)
+        return written
+    return run
+
+
+def test_ingest_merges_work_description_and_subjects(ingest):
+    rows = ingest({"9780195153446": ALL, "9780002005012": ALL})
+
+    pages, genres, desc, _, prov = rows["9780195153446"]
+    assert pages == 320  # first edition wins over OL4M's 999
+    assert genres == eb.normalize_genres(["Fantasy fiction"])  # first copy of the duplicated work
+    assert desc == "A work-level description of the book."
+    assert prov["genres"]["via"] == "dump" and prov["description"]["src"] == "openlibrary"
+
+    pages, genres, desc, _, _ = rows["9780002005012"]
+    assert pages is None
+    assert genres == eb.normalize_genres(["Romance"])  # edition subjects beat the work's
+    assert desc == "A work-level description of the book."
+
+
+def test_ingest_keeps_edition_data_when_work_is_missing(ingest):
+    rows = ingest({"9780306406157": frozenset({"page_count", "genres", "description"})})
+    assert rows["9780306406157"][:3] == (210, [], None)
+
+
+def test_ingest_writes_only_missing_fields(ingest):
+    rows = ingest({"9780195153446": frozenset({"description"})})
+    pages, genres, desc, _, prov = rows["9780195153446"]
+    assert (pages, genres) == (None, [])
+    assert desc == "A work-level description of the book."
+    assert set(prov) == {"description"}
+
+
+def test_ingest_without_works_dump(ingest):
+    rows = ingest({"9780195153446": ALL}, works=None)
+    assert rows["9780195153446"][:3] == (320, [], None)
@@ -0,0 +1,93 @@
+# backend/scripts/enrich_books/tests/test_pipeline.py
+import threading, time
+
+import pytest
+
+from journal import Journal
+from pipeline import PipelineError, run_pipeline
+
+
+def collect(**kw):
+    written = []
+    n = run_pipeline(write=lambda buf: written.append(list(buf)), **kw)
+    return n, written
+
+
+def test_every_result_is_written_once():
+    n, written = collect(produce=range(100), work=lambda x: x * 2, workers=4, queue_size=3,
+                         flush_rows=7, flush_sec=10)
+    flat = [x for buf in written for x in buf]
+    assert n == 100
+    assert sorted(flat) == [x * 2 for x in range(100)]
+    assert all(len(buf) <= 7 for buf in written)
+
+
+def test_none_results_are_dropped_and_lists_flattened():
+    n, written = collect(produce=range(6), work=lambda x: None if x % 2 else [x, x], workers=2,
+                         queue_size=2, flush_rows=100, flush_sec=10, flatten=True)
+    assert sorted(x for buf in written for x in buf) == [0, 0, 2, 2, 4, 4]
+
+
+def test_flushes_on_time_while_the_producer_is_slow():
+    stamps = []
+
+    def produce():
+        for i in range(3):
+            yield i
+            time.sleep(0.3)
+
+    run_pipeline(produce(), lambda x: x, lambda buf: stamps.append((time.monotonic(), list(buf))),
+                 workers=1, queue_size=1, flush_rows=100, flush_sec=0.1)
+    assert len(stamps) >= 3  # not one write at the end
+
+
+def test_failed_stage_stops_everything_and_keeps_fetched_results():
+    def work(x):
+        if x == 5:
+            raise ValueError("boom")
+        return x
+
+    written = []
+    with pytest.raises(PipelineError) as exc:
+        run_pipeline(iter(range(1000)), work, written.extend, workers=1, queue_size=2,
+                     flush_rows=1000, flush_sec=10)
+    assert isinstance(exc.value.__cause__, ValueError)
+    assert written == [0, 1, 2, 3, 4]  # buffered results still written
+    assert not any(t.name.startswith(("produce", "fetch-")) for t in threading.enumerate())
+
+
+def test_producer_error_is_raised():
+    def produce():
+        yield 1
+        raise RuntimeError("db gone")
+
+    with pytest.raises(PipelineError):
+        collect(produce=produce(), work=lambda x: x, workers=2, queue_size=2, flush_rows=1, flush_sec=1)
+
+
+def test_journal_holds_exactly_what_was_not_written(tmp_path):
+    journal = Journal(str(tmp_path / "j.jsonl"), fsync=False)
+    written = []
+
+    def write(buf):
+        if written:
+            raise KeyboardInterrupt  # second signal while results are still queued
+        written.extend(r[0] for r in buf)
+
+    with pytest.raises(KeyboardInterrupt):
+        run_pipeline(iter(range(50)), lambda x: [[x]], write, workers=3, queue_size=4,
+                     flush_rows=2, flush_sec=10, flatten=True, journal=journal)
+    left = [r[0] for _, rows in journal.read() for r in rows]
+    # written results were checkpointed away; everything fetched after them
+    # (the failed flush, queued and in-flight chunks) is still journaled
+    assert len(written) == 2 and left
+    assert sorted(written + left) == list(range(len(written) + len(left)))
+    journal.close()
+
+
+def test_journal_is_empty_after_a_clean_run(tmp_path):
+    journal = Journal(str(tmp_path / "j.jsonl"), fsync=False)
+    run_pipeline(iter(range(20)), lambda x: [[x]], lambda buf: None, workers=3, queue_size=2,
+                 flush_rows=3, flush_sec=10, flatten=True, journal=journal)
+    assert journal.empty()
+    journal.close()
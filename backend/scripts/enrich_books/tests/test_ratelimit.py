@@ -0,0 +1,108 @@
+# backend/scripts/enrich_books/tests/test_ratelimit.py
+import pytest
+
+import ratelimit
+from ratelimit import AdaptiveBucket, HostLimiters, TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    """monotonic() + sleep() that advances it: timing without waiting."""
+
+    def __init__(self):
+        self.t = 100.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.t
+
+    def sleep(self, s: float):
+        s = max(s, 1e-6)  # a real sleep always lets the clock move on
+        self.t += s
+        self.slept += s
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", c.monotonic)
+    monkeypatch.setattr(ratelimit.time, "sleep", c.sleep)
+    return c
+
+
+def test_token_bucket_paces_to_rate(clock):
+    b = TokenBucket(rate=5)  # burst defaults to max(1, rate)
+    for _ in range(5):
+        b.acquire()
+    assert clock.slept == 0  # the initial burst is free
+    for _ in range(10):
+        b.acquire()
+    assert clock.slept == pytest.approx(10 / 5)
+
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    b = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        b.acquire()
+    clock.t += 60  # idle for a long time: capped at `burst`, not 120 tokens
+    for _ in range(3):
+        b.acquire()
+    assert clock.slept == 0
+    b.acquire()
+    assert clock.slept == pytest.approx(0.5)
+
+
+def test_zero_rate_is_unlimited(clock):
+    b = TokenBucket(rate=0)
+    for _ in range(1000):
+        b.acquire()
+    assert clock.slept == 0
+
+
+def test_adaptive_increases_per_second_not_per_answer(clock):
+    b = AdaptiveBucket(5, max_rate=20, increase=2.0)
+    for _ in range(100):  # 100 fast answers within one second
+        clock.t += 0.01
+        b.feedback(200, 0.05)
+    assert b.rate == pytest.approx(7.0)
+
+
+def test_adaptive_cuts_once_per_cooldown_and_respects_floor(clock):
+    b = AdaptiveBucket(10, min_rate=4, max_rate=20, decrease=0.5, cooldown=1.0)
+    b.feedback(503, 0.1)
+    b.feedback(503, 0.1)  # same cooldown window: in-flight requests, no second cut
+    assert b.rate == pytest.approx(5) and b.cuts == 1
+    clock.t += 1.0
+    b.feedback(None, 0.1)  # network error
+    assert b.rate == pytest.approx(4)  # floored
+
+
+def test_adaptive_slow_answers_do_not_increase(clock):
+    b = AdaptiveBucket(5, max_rate=20, latency_target=1.0)
+    clock.t += 1
+    b.feedback(200, 2.0)
+    assert b.rate == 5
+
+
+def test_retry_after_pauses_the_bucket(clock):
+    b = AdaptiveBucket(10, max_rate=20)
+    b.feedback(429, 0.1, retry_after=3)
+    t0 = clock.t
+    b.acquire()
+    assert clock.t - t0 >= 3
+
+
+def test_retry_after_header_forms():
+    assert retry_after_seconds("7") == 7.0
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("soon") is None
+    assert retry_after_seconds("Mon, 01 Jan 2001 00:00:00 GMT") == 0.0  # in the past
+
+
+def test_host_limiters_match_suffix_and_port():
+    ol, stub = TokenBucket(1), TokenBucket(1)
+    limiters = HostLimiters({"openlibrary.org": ol, "127.0.0.1:8089": stub})
+    assert limiters.for_url("https://openlibrary.org/isbn/1.json") is ol
+    assert limiters.for_url("https://covers.openlibrary.org/b/id/1.jpg") is ol
+    assert limiters.for_url("http://127.0.0.1:8089/isbn/1.json") is stub
+    assert limiters.for_url("http://127.0.0.1:9999/isbn/1.json") is None
+    assert limiters.for_url("https://notopenlibrary.org/") is None
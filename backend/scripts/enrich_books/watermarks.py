@@ -0,0 +1,36 @@
+# backend/scripts/enrich_books/watermarks.py
+# Per-job high-water marks for incremental jobs (taste vectors, popularity).
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Optional
+
+# rated_at defaults to the transaction start, so a rating can commit after a
+# run already moved past its timestamp -> incremental runs re-read this window
+WATERMARK_LAG_S = int(os.getenv("WATERMARK_LAG_S", "300"))
+
+
+def ensure_watermarks(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS job_watermarks (
+          job        text PRIMARY KEY,
+          mark       timestamptz NOT NULL,
+          updated_at timestamptz NOT NULL DEFAULT now()
+        );
+    """)
+
+
+def get_watermark(cur, job: str) -> Optional[datetime]:
+    cur.execute("SELECT mark FROM job_watermarks WHERE job = %s", (job,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(cur, job: str, mark: datetime):
+    """Only ever moves forward; commit together with the data it covers."""
+    cur.execute("""
+        INSERT INTO job_watermarks (job, mark) VALUES (%s, %s)
+        ON CONFLICT (job) DO UPDATE
+          SET mark = GREATEST(job_watermarks.mark, EXCLUDED.mark), updated_at = now()
+    """, (job, mark))